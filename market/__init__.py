@@ -1,17 +1,23 @@
 import sys
 import os
+import json
 import logging
 import yaml
 
-from typing import Optional, Any, List, Dict
+from hashlib import blake2b
+from time import perf_counter
+
+from typing import Optional, Any, List, Dict, Tuple, Hashable
 
 from dotenv import load_dotenv, find_dotenv
 
+from requests.exceptions import RequestException
+
 from prometheus_flask_exporter import PrometheusMetrics
 from prometheus_client.core import REGISTRY
 
-from flask import Flask, current_app
-from flask_smorest import Api, Blueprint
+from flask import Flask, Response, current_app, request as flask_request
+from flask_smorest import Api, Blueprint, abort
 
 from webargs.flaskparser import FlaskParser
 
@@ -21,18 +27,80 @@ from market.api import (
     MarketAPI,
     MarketAPIManager
 )
+from market.crawler import (
+    load_categories
+)
 from market.enum import (
     MarketRegion
 )
+from market.feed import (
+    ChangeFeed
+)
+from market.history import (
+    HistoryStore
+)
+from market.movers import (
+    MoversIndex
+)
+from market.orderbook import (
+    OrderBookStats,
+    dump_stats,
+    load_stats,
+    order_book_stats,
+    parse_orders
+)
+from market.search import (
+    SearchIndex
+)
+from market.metrics import (
+    cache_info_collector,
+    render_duration,
+    response_compression_ratio
+)
+from market.util.cache import (
+    LRUCache
+)
+from market.util.ratelimit import (
+    LimitExceeded
+)
+from market.util.circuit import (
+    CircuitOpen
+)
+from market.util.compress import (
+    compress,
+    preferred_encodings
+)
+from market.util.record import (
+    RecordFormat
+)
 from market.model import (
     IndexRequest,
     IndexResponse,
     RequestItem,
     ResponseItem,
+    ResponseItemFormat,
     RequestItems,
     ResponseItems,
+    ResponseItemsFormat,
     RequestItemBidding,
     ResponseItemBidding,
+    ResponseItemBiddingFormat,
+    RequestItemBatch,
+    ResponseItemBatch,
+    RequestItemBiddingBatch,
+    ResponseItemBiddingBatch,
+    RequestOrderStats,
+    RequestOrderStatsBatch,
+    ResponseOrderStats,
+    ResponseOrderStatsBatch,
+    RequestHistory,
+    ResponseHistory,
+    RequestMovers,
+    ResponseMovers,
+    RequestStream,
+    ResponseChange,
+    RequestSearch,
+    ResponseSearch,
     Item,
     ItemBidding
 )
@@ -59,15 +127,159 @@ web_app.config.update({
     'OPENAPI_JSON_PATH': 'api-spec.json',
     'OPENAPI_SWAGGER_UI_PATH': '/swagger',
     'OPENAPI_SWAGGER_UI_URL': 'https://cdnjs.cloudflare.com/ajax/libs/swagger-ui/3.24.2/',
+    'BATCH_CONCURRENCY': int(os.getenv('BATCH_CONCURRENCY', 8)),
+    'RENDER_CACHE_SIZE': int(os.getenv('RENDER_CACHE_SIZE', 1024)),
+    'COMPRESS_MIN_SIZE': int(os.getenv('COMPRESS_MIN_SIZE', 512)),
+    'COMPRESS_LEVELS': {
+        'gzip': int(os.getenv('COMPRESS_GZIP_LEVEL', 6)),
+        'br': int(os.getenv('COMPRESS_BROTLI_LEVEL', 5)),
+    },
+    'STREAM_HEARTBEAT': float(os.getenv('STREAM_HEARTBEAT', 15)),
 })
 
+render_cache = LRUCache(maxsize=web_app.config['RENDER_CACHE_SIZE'])
+cache_info_collector.register_cache('rendered', render_cache.info)
+
 web_app_metrics = PrometheusMetrics(web_app, registry=REGISTRY)
 web_app_metrics.info(name='BDOMarket', description='Black Desert Online Market API', version='0.0.1', major=0, minor=0, patch=1)
 
 web_app.bdo_market_api_manager: MarketAPIManager = bdo_market_api_manager
+web_app.history_store: Optional[HistoryStore] = HistoryStore.from_env()
+if web_app.history_store is not None:
+    bdo_market_api_manager.add_listener(web_app.history_store.record)
+def cached_market_lists(region: MarketRegion) -> List[Dict[Any, Any]]:
+    calls = [{'mainCategory': category, 'subCategory': subcategory} for category, subcategories in load_categories(os.getenv('CRAWLER_CATEGORIES')).items() for subcategory in subcategories]
+    return [result for result in MarketAPI.GetWorldMarketList.cached(bdo_market_api_manager.api(region), calls) if result is not None]
+
+web_app.movers_index: MoversIndex = MoversIndex.from_env(cached_market_lists)
+bdo_market_api_manager.add_listener(web_app.movers_index.record)
+web_app.search_index: SearchIndex = SearchIndex.from_env()
+bdo_market_api_manager.add_listener(web_app.search_index.record)
+web_app.change_feed: Optional[ChangeFeed] = ChangeFeed.from_env(bdo_market_api_manager.cache)
+if web_app.change_feed is not None:
+    bdo_market_api_manager.add_change_listener(web_app.change_feed.record)
+    web_app.change_feed.add_event_listener(web_app.movers_index.apply)
+    web_app.change_feed.add_event_listener(web_app.search_index.apply)
+    web_app.before_request(web_app.change_feed.start)
 web_api = Api(web_app)
 web_blp = Blueprint('market', __name__, url_prefix='/')
 
+def render_version(result: Dict[Any, Any]) -> str:
+    return blake2b((result.get('resultMsg') or '').encode(), digest_size=16).hexdigest()
+
+def render_body(record_format: RecordFormat, result: Dict[Any, Any]) -> str:
+    started = perf_counter()
+    records = record_format.parse(result.get('resultMsg') or '')
+    parsed = perf_counter()
+    body = record_format.serialize(records)
+    render_duration.labels(flask_request.endpoint, 'parse').observe(parsed - started)
+    render_duration.labels(flask_request.endpoint, 'serialize').observe(perf_counter() - parsed)
+    return body
+
+def render_records(record_format: RecordFormat, result: Dict[Any, Any], key: Optional[Tuple[Hashable, ...]] = None) -> Response:
+    version = render_version(result)
+    encoding = flask_request.accept_encodings.best_match(preferred_encodings())
+    for etag in (version, *(f'{version}-{name}' for name in preferred_encodings() if name in flask_request.accept_encodings)):
+        if flask_request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            response.vary.add('Accept-Encoding')
+            return response
+    cache_key = (flask_request.endpoint, *key) if key is not None else None
+    cached = render_cache.get(cache_key) if cache_key is not None else None
+    if cached is None or cached[0] != version:
+        body = render_body(record_format, result).encode()
+        cached = (version, body, {})
+        if cache_key is not None:
+            render_cache.set(cache_key, cached)
+    body, encoded = cached[1], cached[2]
+    if encoding is not None and len(body) >= current_app.config['COMPRESS_MIN_SIZE']:
+        if encoding not in encoded:
+            encoded[encoding] = compress(body, encoding, current_app.config['COMPRESS_LEVELS'].get(encoding))
+            response_compression_ratio.labels(flask_request.endpoint, encoding).observe(len(encoded[encoding]) / len(body))
+        response = current_app.response_class(encoded[encoding], mimetype='application/json')
+        response.content_encoding = encoding
+        response.set_etag(f'{version}-{encoding}')
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(version)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def batch_error(error: Exception) -> str:
+    if isinstance(error, LimitExceeded):
+        return 'upstream rate limited'
+    if isinstance(error, CircuitOpen):
+        return 'upstream unavailable'
+    if isinstance(error, RequestException):
+        return 'upstream request failed'
+    if isinstance(error, ValueError):
+        return 'malformed upstream response'
+    logger.error('Batch entry failed', exc_info=error)
+    return 'internal error'
+
+def render_batch(record_format: RecordFormat, keys: List[Dict[str, int]], results: List[Any]) -> Response:
+    entries = []
+    for key, result in zip(keys, results):
+        members = [(name, str(value)) for name, value in key.items()]
+        if not isinstance(result, Exception):
+            try:
+                members.append(('result', render_body(record_format, result)))
+            except Exception as error:
+                result = error
+        if isinstance(result, Exception):
+            members.append(('error', json.dumps(batch_error(result))))
+        entries.append('{' + ','.join(f'"{name}":{value}' for name, value in sorted(members)) + '}')
+    return current_app.response_class('[' + ','.join(entries) + ']', mimetype='application/json')
+
+def render_order_stats(api: MarketAPI, keys: List[Dict[str, int]], results: List[Any], percent: float) -> List[Any]:
+    stats: List[Any] = [None] * len(keys)
+    misses: List[Tuple[int, Tuple[Hashable, ...], str, str, Any]] = []
+    for index, (key, result) in enumerate(zip(keys, results)):
+        if isinstance(result, Exception):
+            stats[index] = result
+            continue
+        version = render_version(result)
+        cache_key = ('market.orders_stats', api.region, key['id'], key['sid'], percent)
+        cached = render_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            stats[index] = cached[1]
+            continue
+        misses.append((index, cache_key, f'{MarketAPI.GetBiddingInfoList.cache_key(api, mainKey=key["id"], subKey=key["sid"])}_stats_{percent}', version, result))
+    pending: List[Tuple[int, Tuple[Hashable, ...], str, str, Any]] = []
+    for (index, cache_key, name, version, result), shared in zip(misses, api.derived_get_many([name for _, _, name, _, _ in misses])):
+        if shared:
+            try:
+                shared_version, data = shared.decode().split(' ', 1)
+                if shared_version == version:
+                    stats[index] = load_stats(data)
+                    render_cache.set(cache_key, (version, stats[index]))
+                    continue
+            except Exception:
+                logger.warning('Discarding undecodable order stats %s', name, exc_info=True)
+        started = perf_counter()
+        try:
+            book = parse_orders(result.get('resultMsg') or '')
+        except ValueError as error:
+            stats[index] = error
+            continue
+        render_duration.labels(flask_request.endpoint, 'parse').observe(perf_counter() - started)
+        pending.append((index, cache_key, name, version, book))
+    if pending:
+        started = perf_counter()
+        computed = order_book_stats([book for _, _, _, _, book in pending], percent)
+        render_duration.labels(flask_request.endpoint, 'analyze').observe(perf_counter() - started)
+        for (index, cache_key, name, version, _), value in zip(pending, computed):
+            render_cache.set(cache_key, (version, value))
+            api.derived_set(name, f'{version} {dump_stats(value)}')
+            stats[index] = value
+    return stats
+
+@web_app.errorhandler(LimitExceeded)
+@web_app.errorhandler(CircuitOpen)
+def upstream_unavailable(error: Exception):
+    return {'code': 503, 'status': 'Service Unavailable', 'message': str(error)}, 503, {'Retry-After': '1'}
+
 @web_blp.route('/')
 @web_blp.route('/health')
 @web_blp.route('/healthz')
@@ -80,18 +292,105 @@ def index(*args, **kwargs) -> IndexResponse:
 @web_blp.arguments(RequestItems.Schema(), location='query')
 @web_blp.response(200, ResponseItems.Schema(many=True))
 def items(request: RequestItems, *args, **kwargs) -> List[ResponseItems]:
-    return current_app.bdo_market_api_manager.api(request.region).GetWorldMarketList(mainCategory=request.category, subCategory=request.subcategory)
+    result = current_app.bdo_market_api_manager.api(request.region).GetWorldMarketList(mainCategory=request.category, subCategory=request.subcategory)
+    return render_records(ResponseItemsFormat, result, (request.region, request.category, request.subcategory))
 
 @web_blp.route('/item')
 @web_blp.arguments(RequestItem.Schema(), location='query')
 @web_blp.response(200, ResponseItem.Schema(many=True))
 def item(request: RequestItem, *args, **kwargs) -> List[ResponseItem]:
-    return current_app.bdo_market_api_manager.api(request.region).GetWorldMarketSubList(mainKey=request.id)
+    result = current_app.bdo_market_api_manager.api(request.region).GetWorldMarketSubList(mainKey=request.id)
+    return render_records(ResponseItemFormat, result, (request.region, request.id))
 
 @web_blp.route('/orders')
 @web_blp.arguments(RequestItemBidding.Schema(), location='query')
 @web_blp.response(200, ResponseItemBidding.Schema(many=True))
 def orders(request: RequestItemBidding, *args, **kwargs) -> List[ResponseItemBidding]:
-    return current_app.bdo_market_api_manager.api(request.region).GetBiddingInfoList(mainKey=request.id, subKey=request.sid)
+    result = current_app.bdo_market_api_manager.api(request.region).GetBiddingInfoList(mainKey=request.id, subKey=request.sid)
+    return render_records(ResponseItemBiddingFormat, result, (request.region, request.id, request.sid))
+
+@web_blp.route('/item/batch', methods=['POST'])
+@web_blp.arguments(RequestItemBatch.Schema(), location='json')
+@web_blp.response(200, ResponseItemBatch.Schema(many=True))
+def item_batch(request: RequestItemBatch, *args, **kwargs) -> List[ResponseItemBatch]:
+    api = current_app.bdo_market_api_manager.api(request.region)
+    results = MarketAPI.GetWorldMarketSubList.many(api, [{'mainKey': item_id} for item_id in request.ids], concurrency=current_app.config['BATCH_CONCURRENCY'])
+    return render_batch(ResponseItemFormat, [{'id': item_id} for item_id in request.ids], results)
+
+@web_blp.route('/orders/batch', methods=['POST'])
+@web_blp.arguments(RequestItemBiddingBatch.Schema(), location='json')
+@web_blp.response(200, ResponseItemBiddingBatch.Schema(many=True))
+def orders_batch(request: RequestItemBiddingBatch, *args, **kwargs) -> List[ResponseItemBiddingBatch]:
+    api = current_app.bdo_market_api_manager.api(request.region)
+    results = MarketAPI.GetBiddingInfoList.many(api, [{'mainKey': key.id, 'subKey': key.sid} for key in request.keys], concurrency=current_app.config['BATCH_CONCURRENCY'])
+    return render_batch(ResponseItemBiddingFormat, [{'id': key.id, 'sid': key.sid} for key in request.keys], results)
+
+@web_blp.route('/orders/stats')
+@web_blp.arguments(RequestOrderStats.Schema(), location='query')
+@web_blp.response(200, ResponseOrderStats.Schema())
+def orders_stats(request: RequestOrderStats, *args, **kwargs) -> OrderBookStats:
+    api = current_app.bdo_market_api_manager.api(request.region)
+    result = api.GetBiddingInfoList(mainKey=request.id, subKey=request.sid)
+    stats = render_order_stats(api, [{'id': request.id, 'sid': request.sid}], [result], request.percent)[0]
+    if isinstance(stats, Exception):
+        abort(502, message=batch_error(stats))
+    return stats
+
+@web_blp.route('/orders/stats/batch', methods=['POST'])
+@web_blp.arguments(RequestOrderStatsBatch.Schema(), location='json')
+@web_blp.response(200, ResponseOrderStatsBatch.Schema(many=True))
+def orders_stats_batch(request: RequestOrderStatsBatch, *args, **kwargs) -> List[ResponseOrderStatsBatch]:
+    api = current_app.bdo_market_api_manager.api(request.region)
+    keys = [{'id': key.id, 'sid': key.sid} for key in request.keys]
+    results = MarketAPI.GetBiddingInfoList.many(api, [{'mainKey': key.id, 'subKey': key.sid} for key in request.keys], concurrency=current_app.config['BATCH_CONCURRENCY'])
+    return [
+        dict(key, error=batch_error(stats)) if isinstance(stats, Exception) else dict(key, result=stats)
+        for key, stats in zip(keys, render_order_stats(api, keys, results, request.percent))
+    ]
+
+@web_blp.route('/history')
+@web_blp.arguments(RequestHistory.Schema(), location='query')
+@web_blp.response(200, ResponseHistory.Schema(many=True))
+def history(request: RequestHistory, *args, **kwargs) -> List[ResponseHistory]:
+    if current_app.history_store is None:
+        abort(404, message='History is not enabled, set HISTORY_DIR')
+    rows = current_app.history_store.query(request.region, request.id, sid=request.sid, start=request.start, end=request.end, limit=request.limit)
+    return [dict(row._asdict(), timestamp=row.ts) for row in rows]
+
+@web_blp.route('/movers')
+@web_blp.arguments(RequestMovers.Schema(), location='query')
+@web_blp.response(200, ResponseMovers.Schema(many=True))
+def movers(request: RequestMovers, *args, **kwargs) -> List[ResponseMovers]:
+    return current_app.movers_index.top(request.region, request.metric, request.top, ascending=request.ascending)
+
+@web_blp.route('/search')
+@web_blp.arguments(RequestSearch.Schema(), location='query')
+@web_blp.response(200, ResponseSearch.Schema(many=True))
+def search(request: RequestSearch, *args, **kwargs) -> List[ResponseSearch]:
+    return [{'id': item_id, 'name': name} for item_id, name in current_app.search_index.search(request.query, request.limit)]
+
+@web_blp.route('/stream')
+@web_blp.arguments(RequestStream.Schema(), location='query')
+@web_blp.response(200, ResponseChange.Schema(), content_type='text/event-stream')
+def stream(request: RequestStream, *args, **kwargs) -> Response:
+    change_feed = current_app.change_feed
+    if change_feed is None:
+        abort(404, message='Change feed is not enabled, set CHANGE_FEED')
+    heartbeat = current_app.config['STREAM_HEARTBEAT']
+
+    def events():
+        with change_feed.subscribe(request.region, set(request.ids or ())) as subscription:
+            yield ': subscribed\n\n'
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'event: {event["endpoint"]}\ndata: {json.dumps(event)}\n\n'
+
+    response = current_app.response_class(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 web_api.register_blueprint(web_blp)
\ No newline at end of file
@@ -1,38 +1,78 @@
+import os
+import sys
+
+server = os.getenv('MARKET_SERVER', 'gevent').lower()
+
+if server in ('gevent', 'prefork'):
+    from gevent import monkey
+    if not monkey.is_module_patched('socket'):
+        os.execv(sys.executable, [sys.executable, '-m', 'gevent.monkey', '--module', 'market', *sys.argv[1:]])
+
+import signal
+import logging
+import gevent
 from typing import List
-from threading import main_thread, Thread
-from market import web_app
+from threading import Event
+from gevent.pool import Pool
 from gevent.pywsgi import WSGIServer
+from market import web_app, bdo_market_api_manager
+from market.crawler import MarketCrawler
+from market.util.supervisor import Supervisor
+from market.util.workers import WorkerProcesses, bind_listener
 
-count = 0
-terminate = False
+logger = logging.getLogger(__name__)
 
-def web(*args, **kwargs):
-    while main_thread().is_alive() and not terminate:
-        wsgi_server = WSGIServer(
-            listener=':8080',
-            application=web_app
-        )
-        wsgi_server.serve_forever()
+mode = os.getenv('MARKET_MODE', 'web').lower()
+listener = (os.getenv('MARKET_HOST', '0.0.0.0'), int(os.getenv('MARKET_PORT', 8080)))
 
-threads: List[Thread] = []
+wsgi_servers: List[WSGIServer] = []
+worker_stopping = Event()
 
-web_thread = Thread(
-    name='web',
-    target=web,
-    daemon=True
+supervisor = Supervisor(
+    max_restarts=int(os.getenv('MARKET_MAX_RESTARTS', 3)),
+    backoff=float(os.getenv('MARKET_RESTART_BACKOFF', 1))
 )
 
-threads.extend([web_thread])
+def web_service() -> None:
+    wsgi_server = WSGIServer(
+        listener=bind_listener(listener, reuse_port=os.getenv('MARKET_REUSE_PORT', 'false').lower() in ('1', 'true', 'yes')),
+        application=web_app,
+        spawn=Pool(int(os.getenv('MARKET_CONCURRENCY', 1000)))
+    )
+    wsgi_servers.append(wsgi_server)
+    try:
+        wsgi_server.serve_forever()
+    finally:
+        wsgi_servers.remove(wsgi_server)
+
+def web_stop() -> None:
+    for wsgi_server in list(wsgi_servers):
+        wsgi_server.stop(timeout=float(os.getenv('MARKET_SHUTDOWN_TIMEOUT', 10)))
 
-for thread in threads:
-    thread.start()
+def worker_service() -> None:
+    crawler = MarketCrawler.from_env(bdo_market_api_manager)
+    crawler.run(
+        interval=float(os.getenv('CRAWLER_INTERVAL', 240)),
+        stop=worker_stopping.is_set
+    )
 
-while main_thread().is_alive() and count <= 3:
-    terminate = any(not thread.is_alive() for thread in threads)
+if mode in ('web', 'all') and server == 'prefork':
+    web_workers = WorkerProcesses(
+        command=[sys.executable, '-m', 'market'],
+        workers=int(os.getenv('MARKET_WORKERS', 0)) or None,
+        env=dict(os.environ, MARKET_SERVER='gevent', MARKET_MODE='web', MARKET_REUSE_PORT='true'),
+        shutdown_timeout=float(os.getenv('MARKET_SHUTDOWN_TIMEOUT', 10)),
+        grace=float(os.getenv('MARKET_RELOAD_GRACE', 2))
+    )
+    supervisor.add('web', web_workers.run, web_workers.stop)
+    gevent.signal_handler(signal.SIGHUP, web_workers.reload)
+elif mode in ('web', 'all'):
+    supervisor.add('web', web_service, web_stop)
+if mode in ('worker', 'all'):
+    supervisor.add('worker', worker_service, worker_stopping.set)
 
-    if terminate:
-        count += 1
+for signum in (signal.SIGINT, signal.SIGTERM):
+    gevent.signal_handler(signum, supervisor.stop)
 
-    for thread in threads:
-        if thread.is_alive():
-            thread.join(60)
\ No newline at end of file
+logger.info('Serving %s on %s:%d with the %s server', mode, *listener, server)
+sys.exit(supervisor.run())
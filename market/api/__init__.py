@@ -1,30 +1,209 @@
 import os
 import json
+import logging
+from inspect import signature
 from functools import wraps
-from typing import Any, Dict, List, Tuple, Union, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Set, Tuple, Union, Optional
 from datetime import timedelta
+from time import monotonic, sleep, time
+from threading import Lock, local
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import HTTPError, RequestException
 from market.common.api import API
 from market.enum import MarketRegion
 from market.util.huffman import HuffmanData
-from redis import Redis, RedisCluster
+from market.util.cache import CacheEntry, LRUCache, SingleFlight
+from market.util.codec import CacheCodec, decode_entry, get_codec
+from market.util.ratelimit import AIMDLimit, TokenBucket
+from market.util.circuit import CircuitBreaker, CircuitOpen
+from market.util.hedge import LatencyWindow, hedged_call
+from market.metrics import cache_info_collector, cache_lookups, cache_refreshes, coalesced_requests, redis_pool_collector, upstream_limit_collector, upstream_limit_wait, hedged_requests, circuit_rejections, stale_fallbacks, cache_latency, redis_errors, upstream_latency, huffman_decode_duration, huffman_payload_size, api_clients, api_manager_startup
+from redis import BlockingConnectionPool, Redis, RedisCluster
+from redis.exceptions import LockError, RedisError
 from requests import Response
 
+logger = logging.getLogger(__name__)
+
+class RefreshSkipped(Exception):
+    pass
+
 def cache_decorator(func):
+    def cache_key(self: "MarketAPI", *args, **kwargs) -> str:
+        return f"{self.region.name}_{func.__name__}_{'_'.join(map(str, args))}_{'_'.join(map(str, kwargs.values()))}"
+
     @wraps(func)
     def inner_func(self: "MarketAPI", *args, **kwargs):
-        cache_name = f"{self.region.name}_{func.__name__}_{'_'.join(map(str, args))}_{'_'.join(map(str, kwargs.values()))}"
-        cached_fetch = self._cache_get(cache_name)
-        if cached_fetch:
-            return cached_fetch
-        fresh_fetch = func(self, *args, **kwargs)
-        self._cache_set(cache_name, fresh_fetch)
-        return fresh_fetch
+        cache_name = cache_key(self, *args, **kwargs)
+        fetch = lambda: func(self, *args, **kwargs)
+        cached_entry = self._cache_get(cache_name)
+        if cached_entry is None or cached_entry.expired:
+            return self._fetch(cache_name, fetch, cached_entry)
+        if not cached_entry.fresh:
+            self._refresh(cache_name, fetch, 'stale', cached_entry)
+        elif self._refresh_due(cache_name, cached_entry):
+            self._refresh(cache_name, fetch, 'ahead', cached_entry)
+        return cached_entry.value
+
+    def refresh_func(self: "MarketAPI", *args, **kwargs):
+        return self._fetch(cache_key(self, *args, **kwargs), lambda: func(self, *args, **kwargs), force=True)
+
+    def many_func(self: "MarketAPI", calls: List[Dict[str, Any]], concurrency: int = 8) -> List[Union[Dict[Any, Any], Exception]]:
+        cache_names = [cache_key(self, **kwargs) for kwargs in calls]
+        results: List[Union[Dict[Any, Any], Exception, None]] = []
+        misses: List[int] = []
+        entries = self._cache_get_many(cache_names)
+        for cache_name, kwargs, cached_entry in zip(cache_names, calls, entries):
+            if cached_entry is None or cached_entry.expired:
+                misses.append(len(results))
+                results.append(None)
+                continue
+            fetch = lambda kwargs=kwargs: func(self, **kwargs)
+            if not cached_entry.fresh:
+                self._refresh(cache_name, fetch, 'stale', cached_entry)
+            elif self._refresh_due(cache_name, cached_entry):
+                self._refresh(cache_name, fetch, 'ahead', cached_entry)
+            results.append(cached_entry.value)
+
+        def fetch_miss(index: int) -> Union[Dict[Any, Any], Exception]:
+            try:
+                return self._fetch(cache_names[index], lambda: func(self, **calls[index]), entries[index])
+            except Exception as error:
+                return error
+
+        if misses:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(misses))), thread_name_prefix=func.__name__) as executor:
+                for index, result in zip(misses, executor.map(fetch_miss, misses)):
+                    results[index] = result
+        return results
+
+    def cached_func(self: "MarketAPI", calls: List[Dict[str, Any]]) -> List[Optional[Dict[Any, Any]]]:
+        entries = self._cache_get_many([cache_key(self, **kwargs) for kwargs in calls])
+        return [cached_entry.value if cached_entry is not None else None for cached_entry in entries]
+
+    inner_func.cache_key = cache_key
+    inner_func.refresh = refresh_func
+    inner_func.many = many_func
+    inner_func.cached = cached_func
     return inner_func
 
+def upstream_failure(error: BaseException) -> bool:
+    if isinstance(error, HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, RequestException)
+
+Listener = Callable[["MarketAPI", str, Dict[str, Any], Dict[Any, Any]], None]
+
+ChangeListener = Callable[["MarketAPI", str, Dict[str, Any], Optional[Dict[Any, Any]], Dict[Any, Any]], None]
+
+def upstream_decorator(func):
+    parameters = signature(func)
+
+    @wraps(func)
+    def inner_func(self: "MarketAPI", *args, **kwargs):
+        method = func.__name__
+        policy = self.policy(method)
+        if not policy.breaker.allow():
+            circuit_rejections.labels(self.region.name, method).inc()
+            raise CircuitOpen(f'{self.region.name} {method} circuit is open')
+        call = lambda: func(self, *args, **kwargs)
+        started = monotonic()
+        try:
+            delay = policy.latency.percentile(policy.hedge_percentile) if policy.hedge_percentile > 0 else None
+            if delay is None:
+                result = call()
+            else:
+                primary_executor, hedge_executor = self._hedge_executors
+                result, hedged, hedge_won = hedged_call(primary_executor, call, delay, hedge_executor)
+                if hedged:
+                    hedged_requests.labels(self.region.name, method, 'won' if hedge_won else 'lost').inc()
+        except BaseException as error:
+            upstream_latency.labels(self.region.name, method, type(error).__name__).observe(monotonic() - started)
+            if upstream_failure(error):
+                policy.breaker.record_failure()
+            else:
+                policy.breaker.release()
+            raise
+        upstream_latency.labels(self.region.name, method, 'ok').observe(monotonic() - started)
+        policy.latency.observe(monotonic() - started)
+        policy.breaker.record_success()
+        if self._listeners or self._change_listeners:
+            arguments = parameters.bind(self, *args, **kwargs)
+            arguments.apply_defaults()
+            self._notify(method, {name: value for name, value in arguments.arguments.items() if name != 'self'}, result)
+        return result
+
+    return inner_func
+
+def method_env(name: str, method: str, default: str) -> str:
+    return os.getenv(f'{name}_{method.upper()}', os.getenv(name, default))
+
+class UpstreamPolicy(NamedTuple):
+    breaker: CircuitBreaker
+    latency: LatencyWindow
+    hedge_percentile: float
+
+    @classmethod
+    def from_env(cls, method: str) -> "UpstreamPolicy":
+        return cls(
+            breaker=CircuitBreaker(
+                failure_threshold=int(method_env('CIRCUIT_FAILURES', method, '5')),
+                reset_timeout=float(method_env('CIRCUIT_RESET_TIMEOUT', method, '30'))
+            ),
+            latency=LatencyWindow(size=int(method_env('HEDGE_WINDOW', method, '256'))),
+            hedge_percentile=float(method_env('HEDGE_PERCENTILE', method, '0'))
+        )
+
+def local_cache_from_env() -> Optional[LRUCache]:
+    local_cache_size = int(os.getenv('LOCAL_CACHE_SIZE', 0))
+    if local_cache_size <= 0:
+        return None
+    local_cache = LRUCache(maxsize=local_cache_size, ttl=float(os.getenv('LOCAL_CACHE_TTL', 300)))
+    cache_info_collector.register_cache('local', local_cache.info)
+    return local_cache
+
+def codec_from_env() -> CacheCodec:
+    level = os.getenv('CACHE_CODEC_LEVEL')
+    return get_codec(os.getenv('CACHE_CODEC', 'zlib'), int(level) if level is not None else None)
+
+def cache_from_env() -> Optional[Union[Redis, RedisCluster]]:
+    max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', 32))
+    connection_options = {
+        'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', 5)),
+        'socket_connect_timeout': float(os.getenv('REDIS_CONNECT_TIMEOUT', 5)),
+        'health_check_interval': int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+    }
+    redis_cluster_url = os.getenv('REDIS_CLUSTER_URL')
+    if redis_cluster_url is not None:
+        return RedisCluster.from_url(redis_cluster_url, max_connections=max_connections, **connection_options)
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url is not None:
+        return Redis(connection_pool=BlockingConnectionPool.from_url(
+            redis_url,
+            max_connections=max_connections,
+            timeout=float(os.getenv('REDIS_POOL_TIMEOUT', 5)),
+            **connection_options
+        ))
+    return None
+
 class MarketAPI(API):
-    def __init__(self, region: MarketRegion, cache: Union[Redis, RedisCluster] = None, *args: Tuple[Any], **kwargs: Dict[Any, Any]) -> None:
+    def __init__(self, region: MarketRegion, cache: Union[Redis, RedisCluster] = None, local_cache: Optional[LRUCache] = None, codec: Optional[CacheCodec] = None, *args: Tuple[Any], **kwargs: Dict[Any, Any]) -> None:
+        kwargs.setdefault('pool_maxsize', int(os.getenv('UPSTREAM_POOL_SIZE', 10)))
+        kwargs.setdefault('pool_block', os.getenv('UPSTREAM_POOL_BLOCK', 'true').lower() in ('1', 'true', 'yes'))
+        if 'rate_limit' not in kwargs:
+            rate = float(os.getenv('UPSTREAM_RATE', 20))
+            burst = os.getenv('UPSTREAM_BURST')
+            kwargs['rate_limit'] = TokenBucket(rate, float(burst) if burst is not None else None)
+        if 'concurrency_limit' not in kwargs:
+            kwargs['concurrency_limit'] = AIMDLimit(
+                initial=float(os.getenv('UPSTREAM_CONCURRENCY', 4)),
+                minimum=float(os.getenv('UPSTREAM_CONCURRENCY_MIN', 1)),
+                maximum=float(os.getenv('UPSTREAM_CONCURRENCY_MAX', kwargs['pool_maxsize']))
+            )
+        kwargs.setdefault('limit_timeout', float(os.getenv('UPSTREAM_LIMIT_TIMEOUT', 10)))
+        kwargs.setdefault('timeout', float(os.getenv('UPSTREAM_TIMEOUT', 5)))
         super().__init__(server=region.value, *args, **kwargs)
         self._region = region
+        upstream_limit_collector.register_api(region.name, self)
         self.session.headers.update({
             'User-Agent': 'BlackDesert'
         })
@@ -33,35 +212,288 @@ class MarketAPI(API):
                 self._response_hook
             ]
         })
-        self._cache = cache
-        if cache is None:
-            redis_url = os.getenv('REDIS_URL')
-            if redis_url is not None:
-                self._cache = Redis.from_url(redis_url)
-            redis_cluster_url = os.getenv('REDIS_CLUSTER_URL')
-            if redis_cluster_url is not None:
-                self._cache = RedisCluster.from_url(redis_cluster_url)
+        self._local_cache = local_cache
+        self._single_flight: SingleFlight[str, Dict[Any, Any]] = SingleFlight()
+        self._lock_timeout = float(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', 10))
+        self._lock_wait = float(os.getenv('SINGLE_FLIGHT_WAIT', 10))
+        self._soft_ttl = float(os.getenv('CACHE_SOFT_TTL', 300))
+        self._hard_ttl = max(self._soft_ttl, float(os.getenv('CACHE_HARD_TTL', 900)))
+        self._refresh_ahead_ratio = float(os.getenv('REFRESH_AHEAD_RATIO', 0.2))
+        self._refresh_ahead_hits = int(os.getenv('REFRESH_AHEAD_MIN_HITS', 10))
+        self._access_counts: LRUCache[str, int] = LRUCache(maxsize=int(os.getenv('REFRESH_AHEAD_KEYS', 4096)))
+        self._refresh_executor = ThreadPoolExecutor(max_workers=int(os.getenv('REFRESH_CONCURRENCY', 4)), thread_name_prefix=f'refresh-{region.name}')
+        self._refreshing: Set[str] = set()
+        self._refreshing_lock = Lock()
+        self._refresh_backoff: LRUCache[str, bool] = LRUCache(maxsize=int(os.getenv('REFRESH_AHEAD_KEYS', 4096)), ttl=float(os.getenv('REFRESH_FAILURE_BACKOFF', 30)))
+        self._cache = cache if cache is not None else cache_from_env()
+        self._codec = codec if codec is not None else codec_from_env()
+        self._error_ttl = float(os.getenv('CACHE_ERROR_TTL', 3600))
+        self._policies: Dict[str, UpstreamPolicy] = {}
+        self._policies_lock = Lock()
+        self._pool_maxsize = kwargs['pool_maxsize']
+        self._hedge_executors: Optional[Tuple[ThreadPoolExecutor, ThreadPoolExecutor]] = None
+        self._listeners: List[Listener] = []
+        self._change_listeners: List[ChangeListener] = []
+        self._fetching = local()
 
     @property
     def region(self) -> MarketRegion:
         return self._region
 
-    def _cache_get(self, name: str) -> Optional[Dict[Any, Any]]:
+    @property
+    def policies(self) -> Dict[str, UpstreamPolicy]:
+        return dict(self._policies)
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def add_change_listener(self, listener: ChangeListener) -> None:
+        self._change_listeners.append(listener)
+
+    def _notify(self, method: str, arguments: Dict[str, Any], result: Dict[Any, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(self, method, arguments, result)
+            except Exception:
+                logger.exception('Listener %r failed for %s', listener, method)
+        previous = getattr(self._fetching, 'previous', None)
+        for change_listener in self._change_listeners:
+            try:
+                change_listener(self, method, arguments, previous, result)
+            except Exception:
+                logger.exception('Change listener %r failed for %s', change_listener, method)
+
+    def policy(self, method: str) -> UpstreamPolicy:
+        policy = self._policies.get(method)
+        if policy is None:
+            with self._policies_lock:
+                policy = self._policies.get(method)
+                if policy is None:
+                    policy = self._policies[method] = UpstreamPolicy.from_env(method)
+                    if policy.hedge_percentile > 0 and self._hedge_executors is None:
+                        self._hedge_executors = (
+                            ThreadPoolExecutor(max_workers=self._pool_maxsize, thread_name_prefix=f'upstream-{self.region.name}'),
+                            ThreadPoolExecutor(max_workers=int(os.getenv('HEDGE_CONCURRENCY', max(1, self._pool_maxsize // 4))), thread_name_prefix=f'hedge-{self.region.name}')
+                        )
+        return policy
+
+    def _cache_encode(self, entry: CacheEntry) -> bytes:
+        return self._codec.encode(entry)
+
+    def _cache_decode(self, name: str, cached_response: Union[str, bytes]) -> Optional[CacheEntry]:
+        try:
+            return decode_entry(cached_response)
+        except Exception:
+            logger.warning('Discarding undecodable cache entry %s', name, exc_info=True)
+            return None
+
+    def _local_cache_set(self, name: str, entry: CacheEntry) -> None:
+        if self._local_cache is not None:
+            ttl = entry.stale_until + self._error_ttl - time()
+            if self._local_cache.ttl is not None:
+                ttl = min(ttl, self._local_cache.ttl)
+            self._local_cache.set(name, entry, ttl=ttl)
+
+    def _redis(self, operation: str, call: Callable[[], Any], default: Any = None) -> Any:
+        started = monotonic()
+        try:
+            return call()
+        except RedisError:
+            redis_errors.labels(operation).inc()
+            logger.warning('Redis %s failed, continuing without the shared cache', operation, exc_info=True)
+            return default
+        finally:
+            cache_latency.labels('l2', operation).observe(monotonic() - started)
+
+    def _cache_get(self, name: str) -> Optional[CacheEntry]:
+        if self._local_cache is not None:
+            started = monotonic()
+            local_entry = self._local_cache.get(name)
+            cache_latency.labels('l1', 'get').observe(monotonic() - started)
+            if local_entry is not None:
+                cache_lookups.labels('l1', 'hit').inc()
+                return local_entry
+            cache_lookups.labels('l1', 'miss').inc()
         if self._cache is not None:
-            cached_response = self._cache.get(name=name)
-            if cached_response:
-                return json.loads(cached_response)
+            cached_response = self._redis('get', lambda: self._cache.get(name=name))
+            cached_entry = self._cache_decode(name, cached_response) if cached_response else None
+            if cached_entry is not None:
+                cache_lookups.labels('l2', 'hit').inc()
+                self._local_cache_set(name, cached_entry)
+                return cached_entry
+            cache_lookups.labels('l2', 'miss').inc()
         return None
 
-    def _cache_set(self, name: str, value: str) -> None:
+    def _cache_get_many(self, names: List[str]) -> List[Optional[CacheEntry]]:
+        entries: List[Optional[CacheEntry]] = [None] * len(names)
+        pending = list(range(len(names)))
+        if self._local_cache is not None:
+            pending = []
+            for index, name in enumerate(names):
+                entries[index] = self._local_cache.get(name)
+                if entries[index] is None:
+                    pending.append(index)
+            cache_lookups.labels('l1', 'hit').inc(len(names) - len(pending))
+            cache_lookups.labels('l1', 'miss').inc(len(pending))
+        if self._cache is not None and pending:
+            mget = getattr(self._cache, 'mget_nonatomic', self._cache.mget)
+            cached_responses = self._redis('mget', lambda: mget([names[index] for index in pending]), [None] * len(pending))
+            for index, cached_response in zip(pending, cached_responses):
+                if cached_response:
+                    entries[index] = self._cache_decode(names[index], cached_response)
+                    if entries[index] is not None:
+                        self._local_cache_set(names[index], entries[index])
+            hits = sum(entries[index] is not None for index in pending)
+            cache_lookups.labels('l2', 'hit').inc(hits)
+            cache_lookups.labels('l2', 'miss').inc(len(pending) - hits)
+        return entries
+
+    def _cache_set(self, name: str, value: Dict[Any, Any]) -> CacheEntry:
+        entry = CacheEntry.create(value, self._soft_ttl, self._hard_ttl)
+        self._access_counts.delete(name)
+        self._local_cache_set(name, entry)
         if self._cache is not None:
-            self._cache.set(
+            value = self._cache_encode(entry)
+            self._redis('set', lambda: self._cache.set(
                 name=name,
-                value=json.dumps(value),
-                ex=timedelta(minutes=5)
-            )
+                value=value,
+                ex=timedelta(seconds=self._hard_ttl + self._error_ttl)
+            ))
+        return entry
+
+    def derived_get_many(self, names: List[str]) -> List[Optional[bytes]]:
+        if self._cache is None or not names:
+            return [None] * len(names)
+        mget = getattr(self._cache, 'mget_nonatomic', self._cache.mget)
+        return self._redis('mget', lambda: mget(names), [None] * len(names))
+
+    def derived_set(self, name: str, value: Union[str, bytes]) -> None:
+        if self._cache is not None:
+            self._redis('set', lambda: self._cache.set(
+                name=name,
+                value=value,
+                ex=timedelta(seconds=self._hard_ttl + self._error_ttl)
+            ))
+
+    def _cache_read(self, name: str) -> Optional[CacheEntry]:
+        cached_response = self._redis('get', lambda: self._cache.get(name=name))
+        return self._cache_decode(name, cached_response) if cached_response else None
+
+    def _cache_adopt(self, name: str, cached_entry: Optional[CacheEntry], known: Optional[CacheEntry]) -> Optional[CacheEntry]:
+        if cached_entry is None or cached_entry.expired or (known is not None and cached_entry.created <= known.created):
+            return None
+        self._local_cache_set(name, cached_entry)
+        return cached_entry
+
+    def _cache_wait(self, name: str, timeout: float, known: Optional[CacheEntry] = None, interval: float = 0.05) -> Optional[CacheEntry]:
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            sleep(interval)
+            cached_entry = self._cache_adopt(name, self._cache_read(name), known)
+            if cached_entry is not None:
+                return cached_entry
+        return None
+
+    def _fetch_once(self, name: str, fetch: Callable[[], Dict[Any, Any]], wait: bool = True, known: Optional[CacheEntry] = None, force: bool = False) -> Optional[Dict[Any, Any]]:
+        lock = None
+        shared_entry = None
+        previous = known
+        if self._cache is not None:
+            lock = self._cache.lock(f'{name}_lock', timeout=self._lock_timeout, blocking=False)
+            acquired = self._redis('lock', lock.acquire)
+            if acquired is None:
+                lock = None
+            elif not acquired:
+                if not wait:
+                    return None
+                lock = None
+                shared_entry = self._cache_wait(name, self._lock_wait, known)
+            elif not force or self._change_listeners:
+                cached_entry = self._cache_read(name)
+                shared_entry = None if force else self._cache_adopt(name, cached_entry, known)
+                previous = cached_entry or known
+        elif previous is None and self._local_cache is not None and self._change_listeners:
+            previous = self._local_cache.get(name)
+        try:
+            if shared_entry is not None:
+                coalesced_requests.labels('remote').inc()
+                return shared_entry.value
+            self._fetching.previous = previous.value if previous is not None else None
+            try:
+                fresh_fetch = fetch()
+            finally:
+                self._fetching.previous = None
+            self._cache_set(name, fresh_fetch)
+            return fresh_fetch
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except LockError:
+                    pass
+                except RedisError:
+                    redis_errors.labels('unlock').inc()
+
+    def _refresh_due(self, name: str, entry: CacheEntry) -> bool:
+        if self._refresh_ahead_hits <= 0:
+            return False
+        hits = (self._access_counts.get(name) or 0) + 1
+        self._access_counts.set(name, hits)
+        return hits >= self._refresh_ahead_hits and entry.fresh_until - time() < (entry.fresh_until - entry.created) * self._refresh_ahead_ratio
+
+    def _refresh(self, name: str, fetch: Callable[[], Dict[Any, Any]], reason: str, known: Optional[CacheEntry] = None) -> None:
+        if self._refresh_backoff.get(name):
+            return
+        with self._refreshing_lock:
+            if name in self._refreshing or name in self._single_flight:
+                return
+            self._refreshing.add(name)
+        cache_refreshes.labels(reason).inc()
+        try:
+            self._refresh_executor.submit(self._refresh_once, name, fetch, known)
+        except RuntimeError:
+            with self._refreshing_lock:
+                self._refreshing.discard(name)
+
+    def _refresh_once(self, name: str, fetch: Callable[[], Dict[Any, Any]], known: Optional[CacheEntry] = None) -> None:
+        def fetch_once() -> Dict[Any, Any]:
+            result = self._fetch_once(name, fetch, wait=False, known=known)
+            if result is None:
+                raise RefreshSkipped(name)
+            return result
+
+        try:
+            self._single_flight.do(name, fetch_once)
+        except RefreshSkipped:
+            logger.debug('Skipped background refresh of %s, another process is fetching it', name)
+        except CircuitOpen:
+            self._refresh_backoff.set(name, True)
+            logger.debug('Skipped background refresh of %s, circuit is open', name)
+        except Exception:
+            self._refresh_backoff.set(name, True)
+            logger.exception('Background refresh of %s failed', name)
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(name)
+
+    def _fetch(self, name: str, fetch: Callable[[], Dict[Any, Any]], stale: Optional[CacheEntry] = None, force: bool = False) -> Dict[Any, Any]:
+        try:
+            try:
+                fresh_fetch, shared = self._single_flight.do(name, lambda: self._fetch_once(name, fetch, known=stale, force=force))
+            except RefreshSkipped:
+                fresh_fetch, shared = self._fetch_once(name, fetch, known=stale, force=force), False
+        except Exception as error:
+            if stale is None:
+                raise
+            stale_fallbacks.labels(type(error).__name__).inc()
+            logger.warning('Serving expired %s after upstream error: %s', name, error)
+            return stale.value
+        if shared:
+            coalesced_requests.labels('local').inc()
+        return fresh_fetch
 
     @cache_decorator
+    @upstream_decorator
     def GetBiddingInfoList(self, mainKey: int, subKey: int, keyType: int = 0) -> Dict[Any, Any]:
         response = self.request(
             url='Trademarket/GetBiddingInfoList',
@@ -75,6 +507,7 @@ class MarketAPI(API):
         return response.json()
 
     @cache_decorator
+    @upstream_decorator
     def GetWorldMarketList(self, mainCategory: int, subCategory: int, keyType: int = 0) -> Dict[Any, Any]:
         response = self.request(
             url='Trademarket/GetWorldMarketList',
@@ -88,6 +521,7 @@ class MarketAPI(API):
         return response.json()
 
     @cache_decorator
+    @upstream_decorator
     def GetWorldMarketSubList(self, mainKey: int, keyType: int = 0) -> Dict[Any, Any]:
         response = self.request(
             url='Trademarket/GetWorldMarketSubList',
@@ -110,26 +544,67 @@ class MarketAPI(API):
         )
         return response.json()
 
+    def _limited(self, waited: float) -> None:
+        upstream_limit_wait.labels(self._region.name).observe(waited)
+
     def _response_hook(self, response: Response, *args, **kwargs) -> Response:
         content_type = response.headers['Content-Type']
 
         if 'application/octet-stream' in content_type.lower():
             response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            response._content = json.dumps({'resultCode': 0, 'resultMsg': HuffmanData(raw_data=response.content).data}).encode()
+            started = monotonic()
+            data = HuffmanData(raw_data=response.content).data
+            huffman_decode_duration.observe(monotonic() - started)
+            huffman_payload_size.labels('compressed').observe(len(response.content))
+            huffman_payload_size.labels('decoded').observe(len(data))
+            response._content = json.dumps({'resultCode': 0, 'resultMsg': data}).encode()
 
         return response
 
 class MarketAPIManager(object):
-    def __init__(self, cache: Redis = None) -> None:
-        self._apis = {
-            region: MarketAPI(region, cache)
-            for region
-            in MarketRegion
-        }
+    def __init__(self, cache: Union[Redis, RedisCluster] = None, local_cache: Optional[LRUCache] = None, codec: Optional[CacheCodec] = None) -> None:
+        started = monotonic()
+        self._local_cache = local_cache if local_cache is not None else local_cache_from_env()
+        self._cache = cache if cache is not None else cache_from_env()
+        self._codec = codec if codec is not None else codec_from_env()
+        if self._cache is not None:
+            redis_pool_collector.register_client('market', self._cache)
+        self._apis: Dict[MarketRegion, MarketAPI] = {}
+        self._listeners: List[Listener] = []
+        self._change_listeners: List[ChangeListener] = []
+        self._lock = Lock()
+        api_manager_startup.set(monotonic() - started)
 
     @property
-    def apis(self) -> List[MarketAPI]:
-        return self._apis
+    def cache(self) -> Optional[Union[Redis, RedisCluster]]:
+        return self._cache
+
+    @property
+    def apis(self) -> Dict[MarketRegion, MarketAPI]:
+        return {region: self.api(region) for region in MarketRegion}
 
     def api(self, region: MarketRegion) -> MarketAPI:
-        return self._apis[region]
+        api = self._apis.get(region)
+        if api is None:
+            with self._lock:
+                api = self._apis.get(region)
+                if api is None:
+                    api = self._apis[region] = MarketAPI(region, self._cache, self._local_cache, self._codec)
+                    for listener in self._listeners:
+                        api.add_listener(listener)
+                    for change_listener in self._change_listeners:
+                        api.add_change_listener(change_listener)
+                    api_clients.inc()
+        return api
+
+    def add_listener(self, listener: Listener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+            for api in self._apis.values():
+                api.add_listener(listener)
+
+    def add_change_listener(self, listener: ChangeListener) -> None:
+        with self._lock:
+            self._change_listeners.append(listener)
+            for api in self._apis.values():
+                api.add_change_listener(listener)
@@ -1,9 +1,11 @@
-from typing import Any, Tuple, Dict, Union
+from typing import Any, Tuple, Dict, Optional, Union
 from urllib.parse import urljoin
 from enum import Enum, unique
+from time import monotonic, sleep
 from requests import Session, Response
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from requests.exceptions import ConnectionError, Timeout
+from market.util.ratelimit import AIMDLimit, LimitExceeded, TokenBucket
 
 @unique
 class Scheme(str, Enum):
@@ -19,15 +21,33 @@ class API:
     def __init__(self, server: str,
                        scheme: Union[str, Scheme] = Scheme.HTTPS,
                        port: Union[int, Port] = Port.HTTPS,
+                       pool_connections: int = 1,
+                       pool_maxsize: int = 10,
+                       pool_block: bool = False,
+                       rate_limit: Optional[TokenBucket] = None,
+                       concurrency_limit: Optional[AIMDLimit] = None,
+                       limit_timeout: Optional[float] = None,
+                       timeout: float = 5,
+                       retries: int = 3,
+                       backoff_factor: float = 0.5,
                        *args: Tuple[Any],
                        **kwargs: Dict[Any, Any]) -> None:
         self._server = server
         self._scheme = str(scheme.value)
         self._port = int(port.value)
         self._url = f'{self._scheme}://{self._server}:{self._port}'
-        self._adapter = HTTPAdapter(max_retries=Retry(
-            total=3
-        ))
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self._rate_limit = rate_limit
+        self._concurrency_limit = concurrency_limit
+        self._limit_timeout = limit_timeout
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff_factor = backoff_factor
         self._session = Session()
         self._session.mount("https://", self._adapter)
         self._session.mount("http://", self._adapter)
@@ -52,11 +72,53 @@ class API:
     def session(self):
         return self._session
 
+    @property
+    def rate_limit(self) -> Optional[TokenBucket]:
+        return self._rate_limit
+
+    @property
+    def concurrency_limit(self) -> Optional[AIMDLimit]:
+        return self._concurrency_limit
+
+    def _limited(self, waited: float) -> None:
+        pass
+
+    def _attempt(self, **kwargs) -> Response:
+        waiting = monotonic()
+        if self._rate_limit is not None and not self._rate_limit.acquire(timeout=self._limit_timeout):
+            raise LimitExceeded(f'{self._server} rate limit of {self._rate_limit.rate}/s reached')
+        started = None
+        if self._concurrency_limit is not None:
+            started = self._concurrency_limit.acquire(self._limit_timeout)
+            if started is None:
+                raise LimitExceeded(f'{self._server} concurrency limit of {int(self._concurrency_limit.limit)} reached')
+        self._limited(monotonic() - waiting)
+        overloaded = False
+        try:
+            response = self._session.request(**kwargs)
+            overloaded = response.status_code == 429 or response.status_code >= 500
+        except (ConnectionError, Timeout):
+            overloaded = True
+            raise
+        finally:
+            if started is not None:
+                self._concurrency_limit.release(started, overloaded)
+        return response
+
     def request(self, **kwargs) -> Response:
         if 'url' in kwargs:
             kwargs['url']  = urljoin(self._url, kwargs['url'])
         if 'timeout' not in kwargs:
-            kwargs['timeout'] = 5
-        response = self._session.request(**kwargs)
+            kwargs['timeout'] = self._timeout
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(**kwargs)
+                break
+            except ConnectionError:
+                if attempt >= self._retries:
+                    raise
+                sleep(self._backoff_factor * 2 ** attempt)
+                attempt += 1
         response.raise_for_status()
         return response
@@ -0,0 +1,135 @@
+import os
+import logging
+import yaml
+import schedule
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from time import monotonic, sleep
+from market.api import MarketAPI, MarketAPIManager
+from market.enum import MarketRegion
+from market.model import ResponseItemsFormat, ResponseItemFormat
+from market.metrics import crawler_requests, crawler_duration
+from market.util.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORIES: Dict[int, Tuple[int, ...]] = {
+    1: tuple(range(1, 22)),
+    5: tuple(range(1, 21)),
+    10: tuple(range(1, 26)),
+    15: tuple(range(1, 7)),
+    20: tuple(range(1, 5)),
+    25: tuple(range(1, 9)),
+    30: tuple(range(1, 3)),
+    35: tuple(range(1, 9)),
+    40: tuple(range(1, 11)),
+    45: tuple(range(1, 5)),
+    50: tuple(range(1, 7)),
+    55: tuple(range(1, 9)),
+    60: tuple(range(1, 9)),
+    65: tuple(range(1, 15)),
+    70: tuple(range(1, 10)),
+    75: tuple(range(1, 8)),
+    80: tuple(range(1, 10)),
+}
+
+def load_categories(path: Optional[str] = None) -> Dict[int, Tuple[int, ...]]:
+    if path is None:
+        return dict(DEFAULT_CATEGORIES)
+    with open(path) as file:
+        return {
+            int(category): tuple(map(int, subcategories))
+            for category, subcategories
+            in yaml.safe_load(file).items()
+        }
+
+class MarketCrawler(object):
+    def __init__(self, manager: MarketAPIManager,
+                       categories: Optional[Dict[int, Tuple[int, ...]]] = None,
+                       regions: Optional[Iterable[MarketRegion]] = None,
+                       concurrency: int = 4,
+                       rate: float = 10.0,
+                       details: bool = True) -> None:
+        self._manager = manager
+        self._categories = categories if categories is not None else dict(DEFAULT_CATEGORIES)
+        self._regions = list(regions if regions is not None else MarketRegion)
+        self._concurrency = concurrency
+        self._buckets = {region: TokenBucket(rate) for region in self._regions}
+        self._details = details
+        self._snapshots: Dict[MarketRegion, Dict[int, Tuple[int, ...]]] = {region: {} for region in self._regions}
+
+    @classmethod
+    def from_env(cls, manager: MarketAPIManager) -> "MarketCrawler":
+        regions = os.getenv('CRAWLER_REGIONS')
+        return cls(
+            manager=manager,
+            categories=load_categories(os.getenv('CRAWLER_CATEGORIES')),
+            regions=[MarketRegion[region.strip()] for region in regions.split(',')] if regions else None,
+            concurrency=int(os.getenv('CRAWLER_CONCURRENCY', 4)),
+            rate=float(os.getenv('CRAWLER_RATE', 10)),
+            details=os.getenv('CRAWLER_DETAILS', 'true').lower() in ('1', 'true', 'yes')
+        )
+
+    def _call(self, region: MarketRegion, method: Callable[..., Dict[Any, Any]], **kwargs: Any) -> Optional[Dict[Any, Any]]:
+        api = self._manager.api(region)
+        self._buckets[region].acquire()
+        try:
+            result = method.refresh(api, **kwargs)
+        except Exception:
+            crawler_requests.labels(region.name, method.__name__, 'error').inc()
+            logger.exception('Crawling %s %s %s failed', region.name, method.__name__, kwargs)
+            return None
+        crawler_requests.labels(region.name, method.__name__, 'ok').inc()
+        return result
+
+    def _crawl_category(self, region: MarketRegion, category: int, subcategory: int) -> List[Tuple[int, ...]]:
+        result = self._call(region, MarketAPI.GetWorldMarketList, mainCategory=category, subCategory=subcategory)
+        return ResponseItemsFormat.parse(result.get('resultMsg') or '') if result else []
+
+    def _crawl_item(self, region: MarketRegion, item_id: int) -> List[Tuple[int, int]]:
+        result = self._call(region, MarketAPI.GetWorldMarketSubList, mainKey=item_id)
+        if not result:
+            return []
+        sid = ResponseItemFormat.index('sid')
+        return [(item_id, record[sid]) for record in ResponseItemFormat.parse(result.get('resultMsg') or '')]
+
+    def _crawl_orders(self, region: MarketRegion, item_id: int, sid: int) -> None:
+        self._call(region, MarketAPI.GetBiddingInfoList, mainKey=item_id, subKey=sid)
+
+    def crawl_region(self, region: MarketRegion) -> List[int]:
+        started = monotonic()
+        categories = [(category, subcategory) for category, subcategories in self._categories.items() for subcategory in subcategories]
+        snapshot: Dict[int, Tuple[int, ...]] = {}
+        with ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix=f'crawler-{region.name}') as executor:
+            for records in executor.map(lambda category: self._crawl_category(region, *category), categories):
+                snapshot.update((record[0], record) for record in records)
+
+            previous = self._snapshots[region]
+            changed = [item_id for item_id, record in snapshot.items() if previous.get(item_id) != record]
+            self._snapshots[region] = snapshot
+
+            if self._details:
+                keys = [key for keys in executor.map(lambda item_id: self._crawl_item(region, item_id), changed) for key in keys]
+                list(executor.map(lambda key: self._crawl_orders(region, *key), keys))
+
+        crawler_duration.labels(region.name).set(monotonic() - started)
+        logger.info('Crawled %s: %d items, %d changed', region.name, len(snapshot), len(changed))
+        return changed
+
+    def crawl(self) -> Dict[MarketRegion, List[int]]:
+        with ThreadPoolExecutor(max_workers=len(self._regions), thread_name_prefix='crawler') as executor:
+            return dict(zip(self._regions, executor.map(self.crawl_region, self._regions)))
+
+    def _crawl_job(self) -> None:
+        try:
+            self.crawl()
+        except Exception:
+            logger.exception('Crawl failed')
+
+    def run(self, interval: float, stop: Callable[[], bool] = lambda: False) -> None:
+        scheduler = schedule.Scheduler()
+        scheduler.every(interval).seconds.do(self._crawl_job)
+        scheduler.run_all()
+        while not stop():
+            scheduler.run_pending()
+            sleep(min(1.0, max(0.0, scheduler.idle_seconds or 1.0)))
@@ -4,3 +4,10 @@ from enum import Enum, unique
 class MarketRegion(Enum):
     NA = 'na-trade.naeu.playblackdesert.com'
     EU = 'eu-trade.naeu.playblackdesert.com'
+
+@unique
+class MoversMetric(Enum):
+    PRICE = 'price'
+    PRICE_PCT = 'price_pct'
+    TRADES = 'trades'
+    STOCK = 'stock'
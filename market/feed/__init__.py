@@ -0,0 +1,233 @@
+import os
+import json
+import logging
+
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple, Union
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import sleep
+
+from redis import Redis, RedisCluster
+from redis.exceptions import RedisError
+
+from market.enum import MarketRegion
+from market.metrics import change_dropped, change_events, change_records, redis_errors, stream_dropped, stream_subscribers
+from market.model import ResponseItemBiddingFormat, ResponseItemFormat, ResponseItemsFormat
+from market.util.record import Record, RecordFormat
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+
+EventListener = Callable[[MarketRegion, Event], None]
+
+class ChangeSource(NamedTuple):
+    endpoint: str
+    record_format: RecordFormat
+    record_key: Callable[[Record], Hashable]
+    context: Callable[[Dict[str, Any]], Dict[str, int]]
+
+CHANGE_SOURCES = {
+    'GetWorldMarketList': ChangeSource('items', ResponseItemsFormat, lambda record: record[0], lambda arguments: {}),
+    'GetWorldMarketSubList': ChangeSource('item', ResponseItemFormat, lambda record: record[:2], lambda arguments: {}),
+    'GetBiddingInfoList': ChangeSource('orders', ResponseItemBiddingFormat, lambda record: record[0], lambda arguments: {'id': arguments['mainKey'], 'sid': arguments['subKey']}),
+}
+
+def diff_records(previous: Dict[Hashable, Record], current: Dict[Hashable, Record]) -> Tuple[List[Record], List[Record]]:
+    changed = [record for key, record in current.items() if previous.get(key) != record]
+    removed = [record for key, record in previous.items() if key not in current]
+    return changed, removed
+
+class Subscription(object):
+    def __init__(self, feed: "ChangeFeed", region: MarketRegion, ids: Optional[Set[int]] = None, queue_size: int = 256) -> None:
+        self._feed = feed
+        self._region = region
+        self._ids = ids
+        self._queue: "Queue[Event]" = Queue(maxsize=queue_size)
+
+    @property
+    def region(self) -> MarketRegion:
+        return self._region
+
+    def offer(self, event: Event) -> None:
+        if self._ids:
+            changes = [change for change in event['changes'] if change['id'] in self._ids]
+            if not changes:
+                return
+            event = dict(event, changes=changes)
+        try:
+            self._queue.put_nowait(event)
+        except Full:
+            stream_dropped.inc()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def close(self) -> None:
+        self._feed.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+class ChangeFeed(object):
+    def __init__(self, cache: Optional[Union[Redis, RedisCluster]] = None, channel: str = 'market_changes', queue_size: int = 256, backlog: int = 1024) -> None:
+        self._cache = cache
+        self._channel = channel
+        self._queue_size = queue_size
+        self._pending: "Queue[Tuple[MarketRegion, str, Dict[str, Any], str, str]]" = Queue(maxsize=backlog)
+        self._worker: Optional[Thread] = None
+        self._subscriptions: Dict[MarketRegion, List[Subscription]] = {region: [] for region in MarketRegion}
+        self._event_listeners: List[EventListener] = []
+        self._lock = Lock()
+        self._listener: Optional[Thread] = None
+        self._pid = os.getpid()
+
+    @classmethod
+    def from_env(cls, cache: Optional[Union[Redis, RedisCluster]] = None) -> Optional["ChangeFeed"]:
+        if os.getenv('CHANGE_FEED', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            cache=cache,
+            channel=os.getenv('CHANGE_FEED_CHANNEL', 'market_changes'),
+            queue_size=int(os.getenv('STREAM_QUEUE_SIZE', 256)),
+            backlog=int(os.getenv('CHANGE_FEED_BACKLOG', 1024))
+        )
+
+    def channel(self, region: MarketRegion) -> str:
+        return f'{self._channel}:{region.name}'
+
+    def add_event_listener(self, listener: EventListener) -> None:
+        with self._lock:
+            self._event_listeners = self._event_listeners + [listener]
+
+    def start(self) -> None:
+        self._reset_after_fork()
+        if self._cache is not None and self._listener is None:
+            with self._lock:
+                self._start_listener()
+
+    def _reset_after_fork(self) -> None:
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = Queue(maxsize=self._pending.maxsize)
+            self._worker = None
+            self._lock = Lock()
+            self._listener = None
+
+    def record(self, api: Any, method: str, arguments: Dict[str, Any], previous: Optional[Dict[Any, Any]], result: Dict[Any, Any]) -> None:
+        if method not in CHANGE_SOURCES or not previous or previous.get('resultMsg') is None or result.get('resultMsg') is None:
+            return
+        if previous['resultMsg'] == result['resultMsg']:
+            return
+        self._reset_after_fork()
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = Thread(name='change-feed-diff', target=self._diff, daemon=True)
+                    self._worker.start()
+        try:
+            self._pending.put_nowait((api.region, method, arguments, previous['resultMsg'], result['resultMsg']))
+        except Full:
+            change_dropped.inc()
+
+    def flush(self) -> None:
+        if self._worker is not None:
+            self._pending.join()
+
+    def _diff(self) -> None:
+        while True:
+            region, method, arguments, previous_msg, result_msg = self._pending.get()
+            try:
+                self.publish_changes(region, method, arguments, previous_msg, result_msg)
+            except Exception:
+                logger.exception('Diffing a %s %s result failed', region.name, method)
+            finally:
+                self._pending.task_done()
+
+    def publish_changes(self, region: MarketRegion, method: str, arguments: Dict[str, Any], previous_msg: str, result_msg: str) -> None:
+        source = CHANGE_SOURCES[method]
+        previous = {source.record_key(record): record for record in source.record_format.parse(previous_msg)}
+        current = {source.record_key(record): record for record in source.record_format.parse(result_msg)}
+        changed, removed = diff_records(previous, current)
+        if not changed and not removed:
+            return
+        context = source.context(arguments)
+        changes = [dict(source.record_format.to_dict(record), **context) for record in changed]
+        changes.extend(dict(source.record_format.to_dict(record), **context, removed=True) for record in removed)
+        change_records.labels(region.name, source.endpoint).inc(len(changes))
+        self.publish(region, {'region': region.name, 'endpoint': source.endpoint, 'changes': changes})
+
+    def publish(self, region: MarketRegion, event: Event) -> None:
+        change_events.labels(region.name, event['endpoint']).inc()
+        if self._cache is not None:
+            try:
+                self._cache.publish(self.channel(region), json.dumps(event))
+                return
+            except RedisError:
+                redis_errors.labels('publish').inc()
+                logger.warning('Publishing %s changes failed, delivering locally only', region.name, exc_info=True)
+        self.dispatch(region, event)
+
+    def dispatch(self, region: MarketRegion, event: Event) -> None:
+        for listener in self._event_listeners:
+            try:
+                listener(region, event)
+            except Exception:
+                logger.exception('Event listener %r failed for %s %s', listener, region.name, event['endpoint'])
+        for subscription in list(self._subscriptions[region]):
+            subscription.offer(event)
+
+    def subscribe(self, region: MarketRegion, ids: Optional[Set[int]] = None) -> Subscription:
+        subscription = Subscription(self, region, ids, self._queue_size)
+        self._reset_after_fork()
+        with self._lock:
+            self._subscriptions[region] = self._subscriptions[region] + [subscription]
+            self._start_listener()
+        stream_subscribers.inc()
+        return subscription
+
+    def _start_listener(self) -> None:
+        if self._cache is not None and self._listener is None:
+            self._listener = Thread(name='change-feed', target=self._listen, daemon=True)
+            self._listener.start()
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions[subscription.region]
+            if subscription not in subscriptions:
+                return
+            self._subscriptions[subscription.region] = [other for other in subscriptions if other is not subscription]
+        stream_subscribers.dec()
+
+    def _listen(self) -> None:
+        regions = {self.channel(region): region for region in MarketRegion}
+        while True:
+            try:
+                pubsub = self._cache.pubsub(ignore_subscribe_messages=True)
+                try:
+                    pubsub.subscribe(*regions)
+                    for message in pubsub.listen():
+                        if message.get('type') == 'message':
+                            self._receive(regions, message)
+                finally:
+                    pubsub.close()
+            except RedisError:
+                redis_errors.labels('subscribe').inc()
+                logger.warning('Change feed subscription failed, resubscribing', exc_info=True)
+            except Exception:
+                logger.exception('Change feed listener failed, resubscribing')
+            sleep(1)
+
+    def _receive(self, regions: Dict[str, MarketRegion], message: Dict[str, Any]) -> None:
+        channel = message['channel']
+        channel = channel.decode() if isinstance(channel, bytes) else channel
+        try:
+            self.dispatch(regions[channel], json.loads(message['data']))
+        except Exception:
+            logger.exception('Dropping change feed message from %s', channel)
@@ -0,0 +1,242 @@
+import os
+import sqlite3
+import logging
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import time
+
+from market.enum import MarketRegion
+from market.model import ResponseItemFormat, ResponseItemsFormat
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SID = -1
+
+COLUMNS = ('ts', 'id', 'sid', 'base_price', 'current_stock', 'total_trades', 'price_min', 'price_max', 'price_last', 'last_sold')
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS history (
+    {', '.join(f'{column} INTEGER' + (' NOT NULL' if column in ('ts', 'id', 'sid') else '') for column in COLUMNS)},
+    PRIMARY KEY (id, sid, ts)
+) WITHOUT ROWID
+'''
+
+class HistoryRow(NamedTuple):
+    ts: int
+    id: int
+    sid: int
+    base_price: Optional[int]
+    current_stock: Optional[int]
+    total_trades: Optional[int]
+    price_min: Optional[int]
+    price_max: Optional[int]
+    price_last: Optional[int]
+    last_sold: Optional[int]
+
+def summary_rows(ts: int, result_msg: str) -> List[HistoryRow]:
+    return [
+        HistoryRow(ts, item_id, SUMMARY_SID, base_price, current_stock, total_trades, None, None, None, None)
+        for item_id, current_stock, total_trades, base_price in ResponseItemsFormat.parse(result_msg)
+    ]
+
+def detail_rows(ts: int, result_msg: str) -> List[HistoryRow]:
+    return [
+        HistoryRow(ts, item_id, sid, base_price, current_stock, total_trades, price_min, price_max, price_last, last_sold)
+        for item_id, sid, _, base_price, current_stock, total_trades, price_min, price_max, price_last, last_sold in ResponseItemFormat.parse(result_msg)
+    ]
+
+ROW_PARSERS = {
+    'GetWorldMarketList': summary_rows,
+    'GetWorldMarketSubList': detail_rows,
+}
+
+def day_of(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+class HistoryStore(object):
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024, batch_size: int = 5000, flush_interval: float = 1.0, max_readers: int = 4, max_reader_files: int = 32) -> None:
+        self._path = path
+        self._mmap_size = mmap_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: "Queue[Optional[Tuple[MarketRegion, List[HistoryRow]]]]" = Queue()
+        self._writer: Optional[Thread] = None
+        self._writer_lock = Lock()
+        self._max_readers = max_readers
+        self._max_reader_files = max_reader_files
+        self._readers: "OrderedDict[str, List[sqlite3.Connection]]" = OrderedDict()
+        self._readers_lock = Lock()
+        self._pid = os.getpid()
+
+    @classmethod
+    def from_env(cls) -> Optional["HistoryStore"]:
+        path = os.getenv('HISTORY_DIR')
+        if not path:
+            return None
+        return cls(
+            path=path,
+            mmap_size=int(os.getenv('HISTORY_MMAP_SIZE', 256 * 1024 * 1024)),
+            batch_size=int(os.getenv('HISTORY_BATCH_SIZE', 5000)),
+            flush_interval=float(os.getenv('HISTORY_FLUSH_INTERVAL', 1)),
+            max_readers=int(os.getenv('HISTORY_MAX_READERS', 4)),
+            max_reader_files=int(os.getenv('HISTORY_MAX_READER_FILES', 32))
+        )
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _file(self, region: MarketRegion, day: str) -> str:
+        return os.path.join(self._path, region.name, f'{day}.sqlite3')
+
+    def _connect(self, file: str, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            connection = sqlite3.connect(f'file:{file}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            connection = sqlite3.connect(file, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+        connection.execute('PRAGMA busy_timeout=5000')
+        connection.execute(f'PRAGMA mmap_size={int(self._mmap_size)}')
+        return connection
+
+    def record(self, api: Any, method: str, kwargs: Dict[str, Any], result: Dict[Any, Any]) -> None:
+        parser = ROW_PARSERS.get(method)
+        if parser is None or not result.get('resultMsg'):
+            return
+        rows = parser(int(time()), result['resultMsg'])
+        if rows:
+            self.append(api.region, rows)
+
+    def _reset_after_fork(self) -> None:
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._queue = Queue()
+            self._writer = None
+            self._writer_lock = Lock()
+            self._readers = OrderedDict()
+            self._readers_lock = Lock()
+
+    def append(self, region: MarketRegion, rows: List[HistoryRow]) -> None:
+        self._reset_after_fork()
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = Thread(name='history-writer', target=self._write, daemon=True)
+                    self._writer.start()
+        self._queue.put((region, rows))
+
+    def flush(self) -> None:
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._readers_lock:
+            readers = [connection for connections in self._readers.values() for connection in connections]
+            self._readers.clear()
+        for connection in readers:
+            connection.close()
+
+    @contextmanager
+    def _reader(self, file: str) -> Iterator[sqlite3.Connection]:
+        self._reset_after_fork()
+        with self._readers_lock:
+            idle = self._readers.get(file)
+            connection = idle.pop() if idle else None
+        if connection is None:
+            connection = self._connect(file, readonly=True)
+        try:
+            yield connection
+        except Exception:
+            connection.close()
+            raise
+        with self._readers_lock:
+            idle = self._readers.setdefault(file, [])
+            self._readers.move_to_end(file)
+            if len(idle) < self._max_readers:
+                idle.append(connection)
+                connection = None
+            evicted = [self._readers.popitem(last=False)[1] for _ in range(len(self._readers) - self._max_reader_files)]
+        for stale in [connection, *(stale for connections in evicted for stale in connections)]:
+            if stale is not None:
+                stale.close()
+
+    def _drain(self) -> Tuple[Dict[Tuple[MarketRegion, str], List[HistoryRow]], int, bool]:
+        batches: Dict[Tuple[MarketRegion, str], List[HistoryRow]] = {}
+        items, count = 0, 0
+        item = self._queue.get()
+        while True:
+            items += 1
+            if item is None:
+                return batches, items, True
+            region, rows = item
+            for row in rows:
+                batches.setdefault((region, day_of(row.ts)), []).append(row)
+            count += len(rows)
+            if count >= self._batch_size:
+                return batches, items, False
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except Empty:
+                return batches, items, False
+
+    def _write(self) -> None:
+        connections: Dict[str, sqlite3.Connection] = {}
+        stopping = False
+        while not stopping:
+            batches, items, stopping = self._drain()
+            try:
+                for (region, day), rows in batches.items():
+                    file = self._file(region, day)
+                    connection = connections.get(file)
+                    if connection is None:
+                        for stale in [name for name in connections if os.path.basename(name) < f'{day}.sqlite3']:
+                            connections.pop(stale).close()
+                        connection = connections[file] = self._connect(file)
+                    with connection:
+                        connection.executemany(f'INSERT OR REPLACE INTO history VALUES ({", ".join("?" * len(COLUMNS))})', rows)
+            except Exception:
+                logger.exception('Writing %d history rows failed', sum(map(len, batches.values())))
+            finally:
+                for _ in range(items):
+                    self._queue.task_done()
+        for connection in connections.values():
+            connection.close()
+
+    def query(self, region: MarketRegion, item_id: int, sid: Optional[int] = None, start: Optional[float] = None, end: Optional[float] = None, limit: int = 10000) -> List[HistoryRow]:
+        end = time() if end is None else end
+        start = end - 86400 if start is None else start
+        rows: List[HistoryRow] = []
+        for day in self._days(region, start, end):
+            file = self._file(region, day)
+            with self._reader(file) as connection:
+                if sid is None:
+                    cursor = connection.execute('SELECT * FROM history WHERE id = ? AND ts BETWEEN ? AND ? ORDER BY ts, sid LIMIT ?', (item_id, int(start), int(end), limit - len(rows)))
+                else:
+                    cursor = connection.execute('SELECT * FROM history WHERE id = ? AND sid = ? AND ts BETWEEN ? AND ? ORDER BY ts LIMIT ?', (item_id, sid, int(start), int(end), limit - len(rows)))
+                rows.extend(HistoryRow(*row) for row in cursor)
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def _days(self, region: MarketRegion, start: float, end: float) -> Iterator[str]:
+        first, last = day_of(max(0.0, start)), day_of(end)
+        try:
+            files = os.listdir(os.path.join(self._path, region.name))
+        except FileNotFoundError:
+            return
+        for file in sorted(files):
+            day, extension = os.path.splitext(file)
+            if extension == '.sqlite3' and first <= day <= last:
+                yield day
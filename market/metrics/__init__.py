@@ -0,0 +1,245 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from market.util.cache import CacheInfo
+from market.util.huffman import codebook_cache_info
+
+class CacheInfoCollector(Collector):
+    def __init__(self, caches: Optional[Dict[str, Callable[[], CacheInfo]]] = None) -> None:
+        self._caches = dict(caches or {})
+
+    def register_cache(self, name: str, info: Callable[[], CacheInfo]) -> None:
+        self._caches[name] = info
+
+    def collect(self) -> Iterator[Metric]:
+        hits = CounterMetricFamily('market_cache_hits', 'In-process cache hits', labels=['cache'])
+        misses = CounterMetricFamily('market_cache_misses', 'In-process cache misses', labels=['cache'])
+        size = GaugeMetricFamily('market_cache_size', 'In-process cache entries', labels=['cache'])
+        for name, info in self._caches.items():
+            cache_info = info()
+            hits.add_metric([name], cache_info.hits)
+            misses.add_metric([name], cache_info.misses)
+            size.add_metric([name], cache_info.currsize)
+        yield hits
+        yield misses
+        yield size
+
+cache_info_collector = CacheInfoCollector({
+    'huffman_codebook': codebook_cache_info
+})
+REGISTRY.register(cache_info_collector)
+
+cache_lookups = Counter(
+    'market_response_cache_lookups',
+    'Upstream response cache lookups by layer (l1 in-process, l2 redis)',
+    ['layer', 'result']
+)
+
+coalesced_requests = Counter(
+    'market_coalesced_requests',
+    'Upstream fetches answered by another caller\'s in-flight fetch (local in-process, remote via redis lock)',
+    ['scope']
+)
+
+cache_refreshes = Counter(
+    'market_cache_refreshes',
+    'Background refreshes of cached upstream responses (stale: served past soft ttl, ahead: hot key near soft ttl)',
+    ['reason']
+)
+
+crawler_requests = Counter(
+    'market_crawler_requests',
+    'Upstream calls made by the background crawler',
+    ['region', 'method', 'result']
+)
+
+crawler_duration = Gauge(
+    'market_crawler_last_duration_seconds',
+    'Duration of the last completed crawl per region',
+    ['region']
+)
+
+class RedisPoolCollector(Collector):
+    def __init__(self) -> None:
+        self._clients: Dict[str, Any] = {}
+
+    def register_client(self, name: str, client: Any) -> None:
+        self._clients[name] = client
+
+    def _pools(self, client: Any) -> List[Any]:
+        if hasattr(client, 'get_nodes'):
+            return [node.redis_connection.connection_pool for node in client.get_nodes() if node.redis_connection is not None]
+        pool = getattr(client, 'connection_pool', None)
+        return [pool] if pool is not None else []
+
+    def collect(self) -> Iterator[Metric]:
+        created = GaugeMetricFamily('market_redis_pool_connections', 'Open Redis connections', labels=['client'])
+        in_use = GaugeMetricFamily('market_redis_pool_connections_in_use', 'Redis connections checked out of the pool', labels=['client'])
+        maximum = GaugeMetricFamily('market_redis_pool_max_connections', 'Redis connection pool limit', labels=['client'])
+        for name, client in self._clients.items():
+            try:
+                pools = self._pools(client)
+            except Exception:
+                pools = []
+            open_connections = busy_connections = 0.0
+            for pool in pools:
+                try:
+                    if hasattr(pool, '_connections'):
+                        idle = sum(connection is not None for connection in list(pool.pool.queue))
+                        open_connections += len(pool._connections)
+                        busy_connections += len(pool._connections) - idle
+                    else:
+                        open_connections += pool._created_connections
+                        busy_connections += len(pool._in_use_connections)
+                except (AttributeError, TypeError):
+                    open_connections = busy_connections = float('nan')
+            created.add_metric([name], open_connections)
+            in_use.add_metric([name], busy_connections)
+            maximum.add_metric([name], sum(getattr(pool, 'max_connections', 0) or 0 for pool in pools))
+        yield created
+        yield in_use
+        yield maximum
+
+redis_pool_collector = RedisPoolCollector()
+REGISTRY.register(redis_pool_collector)
+
+class UpstreamLimitCollector(Collector):
+    def __init__(self) -> None:
+        self._apis: Dict[str, Any] = {}
+
+    def register_api(self, name: str, api: Any) -> None:
+        self._apis[name] = api
+
+    def collect(self) -> Iterator[Metric]:
+        waiting = GaugeMetricFamily('market_upstream_queue_depth', 'Upstream calls waiting for a rate limit token or a concurrency slot', labels=['region', 'limit'])
+        in_flight = GaugeMetricFamily('market_upstream_in_flight', 'Upstream calls in flight', labels=['region'])
+        limit = GaugeMetricFamily('market_upstream_concurrency_limit', 'Current adaptive upstream concurrency limit', labels=['region'])
+        circuit = GaugeMetricFamily('market_upstream_circuit_open', 'Whether the upstream circuit breaker rejects calls (1 open, 0.5 half open, 0 closed)', labels=['region', 'method'])
+        for name, api in self._apis.items():
+            if api.rate_limit is not None:
+                waiting.add_metric([name, 'rate'], api.rate_limit.waiting)
+            if api.concurrency_limit is not None:
+                waiting.add_metric([name, 'concurrency'], api.concurrency_limit.waiting)
+                in_flight.add_metric([name], api.concurrency_limit.in_flight)
+                limit.add_metric([name], api.concurrency_limit.limit)
+            for method, policy in getattr(api, 'policies', {}).items():
+                circuit.add_metric([name, method], {'closed': 0.0, 'half_open': 0.5, 'open': 1.0}[policy.breaker.state.value])
+        yield waiting
+        yield in_flight
+        yield limit
+        yield circuit
+
+upstream_limit_collector = UpstreamLimitCollector()
+REGISTRY.register(upstream_limit_collector)
+
+upstream_limit_wait = Histogram(
+    'market_upstream_limit_wait_seconds',
+    'Time upstream calls spent waiting on the rate and concurrency limits',
+    ['region'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+hedged_requests = Counter(
+    'market_upstream_hedged_requests',
+    'Duplicate upstream calls sent after the hedge delay, by whether the duplicate answered first',
+    ['region', 'method', 'result']
+)
+
+circuit_rejections = Counter(
+    'market_upstream_circuit_rejections',
+    'Upstream calls rejected because the circuit breaker was open',
+    ['region', 'method']
+)
+
+stale_fallbacks = Counter(
+    'market_cache_stale_fallbacks',
+    'Expired cache entries served because refreshing them failed',
+    ['error']
+)
+
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+upstream_latency = Histogram(
+    'market_upstream_latency_seconds',
+    'Upstream call latency including retries and hedging, by outcome (ok or the exception raised)',
+    ['region', 'method', 'outcome'],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+huffman_decode_duration = Histogram(
+    'market_huffman_decode_seconds',
+    'Time spent decoding Huffman-compressed upstream responses',
+    buckets=FAST_BUCKETS
+)
+
+huffman_payload_size = Histogram(
+    'market_huffman_payload_bytes',
+    'Size of Huffman-compressed upstream responses before and after decoding',
+    ['stage'],
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+
+render_duration = Histogram(
+    'market_render_seconds',
+    'Time spent parsing resultMsg records and serializing them to JSON on render cache misses',
+    ['endpoint', 'stage'],
+    buckets=FAST_BUCKETS
+)
+
+cache_latency = Histogram(
+    'market_cache_latency_seconds',
+    'Cache operation latency by layer (l1 in-process, l2 redis)',
+    ['layer', 'operation'],
+    buckets=FAST_BUCKETS
+)
+
+redis_errors = Counter(
+    'market_redis_errors',
+    'Redis operations that failed and were skipped',
+    ['operation']
+)
+
+api_clients = Gauge(
+    'market_api_clients',
+    'MarketAPI region clients created in this process'
+)
+
+api_manager_startup = Gauge(
+    'market_api_manager_startup_seconds',
+    'Time spent constructing the MarketAPIManager'
+)
+
+response_compression_ratio = Histogram(
+    'market_response_compression_ratio',
+    'Compressed to uncompressed size of rendered response bodies, observed once per compression',
+    ['endpoint', 'encoding'],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0)
+)
+
+change_events = Counter(
+    'market_change_events',
+    'Change events published after diffing a fetched result against the previous version',
+    ['region', 'endpoint']
+)
+
+change_records = Counter(
+    'market_change_records',
+    'Records that changed between consecutive fetches of the same key',
+    ['region', 'endpoint']
+)
+
+change_dropped = Counter(
+    'market_change_dropped_results',
+    'Fetched results not diffed because the change feed backlog was full'
+)
+
+stream_subscribers = Gauge(
+    'market_stream_subscribers',
+    'Open change stream subscriptions in this process'
+)
+
+stream_dropped = Counter(
+    'market_stream_dropped_events',
+    'Change events dropped because a subscriber was not keeping up'
+)
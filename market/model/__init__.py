@@ -2,8 +2,12 @@ from operator import truth
 from typing import Optional, Any, List, Dict
 from dataclasses import field, asdict
 from marshmallow import Schema, pre_load, post_load, pre_dump, post_dump, fields
+from marshmallow.validate import Length, Range
 from marshmallow_dataclass import dataclass
-from market.enum import MarketRegion
+from market.enum import MarketRegion, MoversMetric
+from market.util.record import RecordFormat
+
+MAX_TIMESTAMP = 253402300799
 
 # API Models
 @dataclass(repr=True, eq=True, order=True, frozen=True)
@@ -66,6 +70,11 @@ class RequestItem(object):
     id: int
     region: MarketRegion = MarketRegion.NA
 
+ResponseItemFormat = RecordFormat(
+    fields=('id', 'enhancement_min', 'enhancement_max', 'base_price', 'current_stock', 'total_trades', 'price_min', 'price_max', 'price_last', 'last_sold'),
+    aliases={'sid': 'enhancement_min'}
+)
+
 @dataclass(repr=True, eq=True, order=True, frozen=True, base_schema=ResponseItemSchema)
 class ResponseItem(object):
     id: int
@@ -118,6 +127,10 @@ class RequestItems(object):
     subcategory: int
     region: MarketRegion = MarketRegion.NA
 
+ResponseItemsFormat = RecordFormat(
+    fields=('id', 'current_stock', 'total_trades', 'base_price')
+)
+
 @dataclass(repr=True, eq=True, order=True, frozen=True, base_schema=ResponseItemsSchema)
 class ResponseItems(object):
     id: int
@@ -161,12 +174,145 @@ class RequestItemBidding(object):
     sid: int
     region: MarketRegion = MarketRegion.NA
 
+ResponseItemBiddingFormat = RecordFormat(
+    fields=('price', 'sellers', 'buyers')
+)
+
 @dataclass(repr=True, eq=True, order=True, frozen=True, base_schema=ResponseItemBiddingSchema)
 class ResponseItemBidding(object):
     price: int
     sellers: int
     buyers: int
 
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestItemBatch(object):
+    ids: List[int] = field(metadata={'validate': Length(min=1, max=100)})
+    region: MarketRegion = MarketRegion.NA
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseItemBatch(object):
+    id: int
+    result: Optional[List[ResponseItem]] = None
+    error: Optional[str] = None
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestItemBiddingKey(object):
+    id: int
+    sid: int
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestItemBiddingBatch(object):
+    keys: List[RequestItemBiddingKey] = field(metadata={'validate': Length(min=1, max=100)})
+    region: MarketRegion = MarketRegion.NA
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseItemBiddingBatch(object):
+    id: int
+    sid: int
+    result: Optional[List[ResponseItemBidding]] = None
+    error: Optional[str] = None
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestOrderStats(object):
+    id: int
+    sid: int
+    region: MarketRegion = MarketRegion.NA
+    percent: float = field(default=5.0, metadata={'validate': Range(min=0, max=100)})
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestOrderStatsBatch(object):
+    keys: List[RequestItemBiddingKey] = field(metadata={'validate': Length(min=1, max=100)})
+    region: MarketRegion = MarketRegion.NA
+    percent: float = field(default=5.0, metadata={'validate': Range(min=0, max=100)})
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseOrderDepth(object):
+    price: int
+    bids: int
+    asks: int
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseOrderStats(object):
+    bid_depth: int
+    ask_depth: int
+    bid_liquidity: int
+    ask_liquidity: int
+    depth: List[ResponseOrderDepth]
+    best_bid: Optional[int] = None
+    best_ask: Optional[int] = None
+    spread: Optional[int] = None
+    mid: Optional[float] = None
+    bid_vwap: Optional[float] = None
+    ask_vwap: Optional[float] = None
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseOrderStatsBatch(object):
+    id: int
+    sid: int
+    result: Optional[ResponseOrderStats] = None
+    error: Optional[str] = None
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestHistory(object):
+    id: int
+    sid: Optional[int] = None
+    region: MarketRegion = MarketRegion.NA
+    start: Optional[int] = field(default=None, metadata={'validate': Range(min=0, max=MAX_TIMESTAMP)})
+    end: Optional[int] = field(default=None, metadata={'validate': Range(min=0, max=MAX_TIMESTAMP)})
+    limit: int = field(default=10000, metadata={'validate': Range(min=1, max=100000)})
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseHistory(object):
+    timestamp: int
+    id: int
+    sid: int
+    base_price: Optional[int] = None
+    current_stock: Optional[int] = None
+    total_trades: Optional[int] = None
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
+    price_last: Optional[int] = None
+    last_sold: Optional[int] = None
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestMovers(object):
+    metric: MoversMetric = MoversMetric.PRICE
+    top: int = field(default=10, metadata={'validate': Range(min=1, max=1000)})
+    ascending: bool = False
+    region: MarketRegion = MarketRegion.NA
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseMovers(object):
+    id: int
+    price: int
+    window_price: int
+    price_change: int
+    price_change_pct: float
+    current_stock: int
+    total_trades: int
+    trades_change: int
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestStream(object):
+    ids: Optional[List[int]] = None
+    region: MarketRegion = MarketRegion.NA
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseChange(object):
+    region: str
+    endpoint: str
+    changes: List[Dict[str, Any]]
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class RequestSearch(object):
+    query: str = field(metadata={'validate': Length(min=1, max=100)})
+    limit: int = field(default=20, metadata={'validate': Range(min=1, max=100)})
+
+@dataclass(repr=True, eq=True, order=True, frozen=True)
+class ResponseSearch(object):
+    id: int
+    name: Optional[str] = None
+
 # Worker Models
 class ItemSchema(Schema):
     @pre_load(pass_many=True)
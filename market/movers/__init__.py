@@ -0,0 +1,140 @@
+import os
+
+from array import array
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from threading import Lock
+from time import time
+
+from market.enum import MarketRegion, MoversMetric
+from market.model import ResponseItemsFormat
+
+RankKey = Tuple[Union[int, float], int]
+
+Loader = Callable[[MarketRegion], Iterable[Dict[Any, Any]]]
+
+class Mover(NamedTuple):
+    id: int
+    price: int
+    window_price: int
+    price_change: int
+    price_change_pct: float
+    current_stock: int
+    total_trades: int
+    trades_change: int
+
+class RegionMovers(object):
+    def __init__(self, window_start: float) -> None:
+        self.window_start = window_start
+        self.slots: Dict[int, int] = {}
+        self.ids = array('q')
+        self.price = array('q')
+        self.stock = array('q')
+        self.trades = array('q')
+        self.window_price = array('q')
+        self.window_trades = array('q')
+        self.indexes: Dict[MoversMetric, List[RankKey]] = {metric: [] for metric in MoversMetric}
+
+    def value(self, metric: MoversMetric, slot: int) -> Union[int, float]:
+        if metric is MoversMetric.PRICE:
+            return self.price[slot] - self.window_price[slot]
+        if metric is MoversMetric.PRICE_PCT:
+            window_price = self.window_price[slot]
+            return (self.price[slot] - window_price) * 100.0 / window_price if window_price else 0.0
+        if metric is MoversMetric.TRADES:
+            return self.trades[slot] - self.window_trades[slot]
+        return self.stock[slot]
+
+    def update(self, item_id: int, stock: int, trades: int, price: int) -> None:
+        slot = self.slots.get(item_id)
+        if slot is None:
+            slot = self.slots[item_id] = len(self.ids)
+            for values, value in ((self.ids, item_id), (self.price, price), (self.stock, stock), (self.trades, trades), (self.window_price, price), (self.window_trades, trades)):
+                values.append(value)
+        elif (self.price[slot], self.stock[slot], self.trades[slot]) == (price, stock, trades):
+            return
+        else:
+            for metric, index in self.indexes.items():
+                del index[bisect_left(index, (self.value(metric, slot), item_id))]
+            self.price[slot], self.stock[slot], self.trades[slot] = price, stock, trades
+        for metric, index in self.indexes.items():
+            insort(index, (self.value(metric, slot), item_id))
+
+    def roll(self, window_start: float) -> None:
+        self.window_start = window_start
+        self.window_price = array('q', self.price)
+        self.window_trades = array('q', self.trades)
+        for metric in self.indexes:
+            self.indexes[metric] = sorted((self.value(metric, slot), item_id) for item_id, slot in self.slots.items())
+
+    def mover(self, item_id: int) -> Mover:
+        slot = self.slots[item_id]
+        return Mover(
+            id=item_id,
+            price=self.price[slot],
+            window_price=self.window_price[slot],
+            price_change=self.value(MoversMetric.PRICE, slot),
+            price_change_pct=self.value(MoversMetric.PRICE_PCT, slot),
+            current_stock=self.stock[slot],
+            total_trades=self.trades[slot],
+            trades_change=self.value(MoversMetric.TRADES, slot)
+        )
+
+class MoversIndex(object):
+    def __init__(self, window: float = 86400, loader: Optional[Loader] = None) -> None:
+        self._window = window
+        self._loader = loader
+        self._loaded: Set[MarketRegion] = set()
+        self._regions: Dict[MarketRegion, RegionMovers] = {}
+        self._lock = Lock()
+        self._load_lock = Lock()
+
+    @classmethod
+    def from_env(cls, loader: Optional[Loader] = None) -> "MoversIndex":
+        return cls(window=float(os.getenv('MOVERS_WINDOW', 86400)), loader=loader)
+
+    def record(self, api: Any, method: str, kwargs: Dict[str, Any], result: Dict[Any, Any]) -> None:
+        if method == 'GetWorldMarketList' and result.get('resultMsg'):
+            self.update(api.region, ResponseItemsFormat.parse(result['resultMsg']))
+
+    def apply(self, region: MarketRegion, event: Dict[str, Any]) -> None:
+        if event['endpoint'] == 'items':
+            self.update(region, [(change['id'], change['current_stock'], change['total_trades'], change['base_price']) for change in event['changes'] if not change.get('removed')])
+
+    def load(self, region: MarketRegion) -> None:
+        if self._loader is None or region in self._loaded:
+            return
+        with self._load_lock:
+            if region in self._loaded:
+                return
+            for result in self._loader(region):
+                if result.get('resultMsg'):
+                    self.update(region, ResponseItemsFormat.parse(result['resultMsg']))
+            self._loaded.add(region)
+
+    def _region(self, region: MarketRegion, now: float) -> RegionMovers:
+        window_start = now - now % self._window
+        movers = self._regions.get(region)
+        if movers is None:
+            movers = self._regions[region] = RegionMovers(window_start)
+        elif window_start > movers.window_start:
+            movers.roll(window_start)
+        return movers
+
+    def update(self, region: MarketRegion, records: Iterable[Tuple[int, ...]], now: Optional[float] = None) -> None:
+        now = time() if now is None else now
+        with self._lock:
+            movers = self._region(region, now)
+            for item_id, stock, trades, price in records:
+                movers.update(item_id, stock, trades, price)
+
+    def top(self, region: MarketRegion, metric: MoversMetric, count: int, ascending: bool = False, now: Optional[float] = None) -> List[Mover]:
+        self.load(region)
+        now = time() if now is None else now
+        with self._lock:
+            if region not in self._regions:
+                return []
+            movers = self._region(region, now)
+            index = movers.indexes[metric]
+            ranked = index[:count] if ascending else index[:-count - 1:-1]
+            return [movers.mover(item_id) for _, item_id in ranked]
@@ -0,0 +1,107 @@
+import re
+import json
+import numpy as np
+
+from typing import List, NamedTuple, Optional, Sequence
+
+ORDERS = re.compile(r'\d+-\d+-\d+(?:\|\d+-\d+-\d+)*')
+
+class DepthLevel(NamedTuple):
+    price: int
+    bids: int
+    asks: int
+
+class OrderBookStats(NamedTuple):
+    best_bid: Optional[int]
+    best_ask: Optional[int]
+    spread: Optional[int]
+    mid: Optional[float]
+    bid_depth: int
+    ask_depth: int
+    bid_vwap: Optional[float]
+    ask_vwap: Optional[float]
+    bid_liquidity: int
+    ask_liquidity: int
+    depth: List[DepthLevel]
+
+def parse_orders(text: str) -> np.ndarray:
+    text = text.strip('|')
+    if not text:
+        return np.empty((0, 3), dtype=np.int64)
+    if ORDERS.fullmatch(text):
+        return np.fromstring(text.replace('|', '-'), dtype=np.int64, sep='-').reshape(-1, 3)
+    tiers = [tier.split('-')[:3] for tier in text.split('|')]
+    if any(len(tier) < 3 for tier in tiers):
+        raise ValueError('Order tiers need price, sellers and buyers')
+    return np.array([[int(value) for value in tier] for tier in tiers], dtype=np.int64)
+
+def order_book_stats(books: Sequence[np.ndarray], percent: float = 5.0) -> List[OrderBookStats]:
+    lengths = np.array([len(book) for book in books], dtype=np.intp)
+    if not lengths.any():
+        return [empty_stats() for _ in books]
+    segment = np.repeat(np.arange(len(books)), lengths)
+    tiers = np.concatenate(books)
+    order = np.lexsort((tiers[:, 0], segment))
+    segment = segment[order]
+    prices, sellers, buyers = tiers[order].T
+    present = lengths > 0
+    starts = (np.cumsum(lengths) - lengths)[present]
+    segments = np.flatnonzero(present)
+
+    no_ask = np.iinfo(np.int64).max
+    best_ask = np.full(len(books), no_ask, dtype=np.int64)
+    best_ask[segments] = np.minimum.reduceat(np.where(sellers > 0, prices, no_ask), starts)
+    best_bid = np.full(len(books), -1, dtype=np.int64)
+    best_bid[segments] = np.maximum.reduceat(np.where(buyers > 0, prices, -1), starts)
+
+    ask_depth = np.zeros(len(books), dtype=np.int64)
+    ask_depth[segments] = np.add.reduceat(sellers, starts)
+    bid_depth = np.zeros(len(books), dtype=np.int64)
+    bid_depth[segments] = np.add.reduceat(buyers, starts)
+    ask_notional = np.zeros(len(books))
+    ask_notional[segments] = np.add.reduceat(prices * sellers.astype(np.float64), starts)
+    bid_notional = np.zeros(len(books))
+    bid_notional[segments] = np.add.reduceat(prices * buyers.astype(np.float64), starts)
+
+    fraction = percent / 100.0
+    ask_near = (sellers > 0) & (prices <= best_ask[segment] * (1.0 + fraction))
+    bid_near = (buyers > 0) & (prices >= best_bid[segment] * (1.0 - fraction))
+    ask_liquidity = np.zeros(len(books), dtype=np.int64)
+    ask_liquidity[segments] = np.add.reduceat(np.where(ask_near, sellers, 0), starts)
+    bid_liquidity = np.zeros(len(books), dtype=np.int64)
+    bid_liquidity[segments] = np.add.reduceat(np.where(bid_near, buyers, 0), starts)
+
+    ask_running = np.cumsum(sellers)
+    cumulative_asks = ask_running - np.repeat(ask_running[starts] - sellers[starts], lengths[present])
+    bid_running = np.cumsum(buyers)
+    cumulative_bids = bid_depth[segment] - (bid_running - np.repeat(bid_running[starts] - buyers[starts], lengths[present])) + buyers
+    depth = np.stack((prices, cumulative_bids, cumulative_asks), axis=1).tolist()
+
+    stats = []
+    for index, (start, length) in enumerate(zip((np.cumsum(lengths) - lengths).tolist(), lengths.tolist())):
+        ask = int(best_ask[index]) if best_ask[index] != no_ask else None
+        bid = int(best_bid[index]) if best_bid[index] >= 0 else None
+        stats.append(OrderBookStats(
+            best_bid=bid,
+            best_ask=ask,
+            spread=ask - bid if ask is not None and bid is not None else None,
+            mid=(ask + bid) / 2 if ask is not None and bid is not None else None,
+            bid_depth=int(bid_depth[index]),
+            ask_depth=int(ask_depth[index]),
+            bid_vwap=float(bid_notional[index] / bid_depth[index]) if bid_depth[index] else None,
+            ask_vwap=float(ask_notional[index] / ask_depth[index]) if ask_depth[index] else None,
+            bid_liquidity=int(bid_liquidity[index]),
+            ask_liquidity=int(ask_liquidity[index]),
+            depth=[DepthLevel(*level) for level in depth[start:start + length]]
+        ))
+    return stats
+
+def empty_stats() -> OrderBookStats:
+    return OrderBookStats(None, None, None, None, 0, 0, None, None, 0, 0, [])
+
+def dump_stats(stats: OrderBookStats) -> str:
+    return json.dumps(stats)
+
+def load_stats(data: str) -> OrderBookStats:
+    *fields, depth = json.loads(data)
+    return OrderBookStats(*fields, [DepthLevel(*level) for level in depth])
@@ -0,0 +1,167 @@
+import os
+import re
+import yaml
+
+from heapq import nsmallest
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from threading import Lock
+
+from market.enum import MarketRegion
+from market.model import ResponseItemFormat, ResponseItemsFormat
+
+TOKEN = re.compile(r'\w+')
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+def item_tokens(item_id: int, name: Optional[str]) -> Set[str]:
+    return {str(item_id), *tokenize(name or '')}
+
+def fuzzy_distance(token: str) -> int:
+    return 0 if len(token) < 3 else 1 if len(token) < 7 else 2
+
+def load_catalog(path: str) -> Dict[int, str]:
+    with open(path) as file:
+        return {
+            int(item_id): str(name)
+            for item_id, name
+            in (yaml.safe_load(file) or {}).items()
+        }
+
+class TrieNode(object):
+    __slots__ = ('children', 'ids', 'token')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, TrieNode] = {}
+        self.ids: Set[int] = set()
+        self.token: Optional[str] = None
+
+class SearchIndex(object):
+    def __init__(self, catalog: Optional[Dict[int, str]] = None) -> None:
+        self._root = TrieNode()
+        self._postings: Dict[str, Set[int]] = {}
+        self._names: Dict[int, Optional[str]] = {}
+        self._keys: Dict[int, str] = {}
+        self._lock = Lock()
+        for item_id, name in (catalog or {}).items():
+            self.add(item_id, name)
+
+    @classmethod
+    def from_env(cls) -> "SearchIndex":
+        path = os.getenv('ITEM_CATALOG')
+        return cls(load_catalog(path) if path else None)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._names
+
+    def name(self, item_id: int) -> Optional[str]:
+        return self._names.get(item_id)
+
+    def add(self, item_id: int, name: Optional[str] = None) -> None:
+        with self._lock:
+            if item_id in self._names:
+                if name is None or name == self._names[item_id]:
+                    return
+                self._unindex(item_id, self._names[item_id])
+            self._names[item_id] = name
+            self._keys[item_id] = name.lower() if name is not None else ''
+            self._index(item_id, name)
+
+    def add_ids(self, item_ids: Iterable[int]) -> None:
+        for item_id in item_ids:
+            if item_id not in self._names:
+                self.add(item_id)
+
+    def record(self, api: Any, method: str, kwargs: Dict[str, Any], result: Dict[Any, Any]) -> None:
+        if method == 'GetWorldMarketList' and result.get('resultMsg'):
+            self.add_ids(record[0] for record in ResponseItemsFormat.parse(result['resultMsg']))
+        elif method == 'GetWorldMarketSubList' and result.get('resultMsg'):
+            self.add_ids(record[0] for record in ResponseItemFormat.parse(result['resultMsg']))
+
+    def apply(self, region: MarketRegion, event: Dict[str, Any]) -> None:
+        if event['endpoint'] in ('items', 'item'):
+            self.add_ids(change['id'] for change in event['changes'])
+
+    def _index(self, item_id: int, name: Optional[str]) -> None:
+        for token in item_tokens(item_id, name):
+            self._postings.setdefault(token, set()).add(item_id)
+            node = self._root
+            for char in token:
+                node = node.children.setdefault(char, TrieNode())
+                node.ids.add(item_id)
+            node.token = token
+
+    def _unindex(self, item_id: int, name: Optional[str]) -> None:
+        for token in item_tokens(item_id, name):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(item_id)
+                if not postings:
+                    del self._postings[token]
+            node = self._root
+            for char in token:
+                node = node.children[char]
+                node.ids.discard(item_id)
+            if token not in self._postings:
+                node.token = None
+
+    def _prefix(self, prefix: str) -> Set[int]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _fuzzy(self, token: str, distance: int, prefix: bool = False) -> Set[int]:
+        matches: Set[int] = set()
+        if distance <= 0:
+            return matches
+        columns = len(token) + 1
+        first = list(range(columns))
+        stack: List[Tuple[str, TrieNode, List[int], Optional[List[int]], str]] = [(char, child, first, None, '') for char, child in self._root.children.items()]
+        while stack:
+            char, node, previous, before, previous_char = stack.pop()
+            row = [previous[0] + 1]
+            for column in range(1, columns):
+                cost = previous[column - 1] + (token[column - 1] != char)
+                cost = min(cost, row[column - 1] + 1, previous[column] + 1)
+                if before is not None and column > 1 and token[column - 1] == previous_char and token[column - 2] == char:
+                    cost = min(cost, before[column - 2] + 1)
+                row.append(cost)
+            if row[-1] <= distance:
+                if prefix:
+                    matches |= node.ids
+                    continue
+                if node.token is not None:
+                    matches |= self._postings[node.token]
+            if min(row) <= distance:
+                stack.extend((child_char, child, row, previous, char) for child_char, child in node.children.items())
+        return matches
+
+    def _lookup(self, token: str, prefix: bool) -> Set[int]:
+        return self._prefix(token) if prefix else self._postings.get(token, set())
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, Optional[str]]]:
+        query = query.strip().lower()
+        tokens = tokenize(query)
+        with self._lock:
+            lookups = [(self._lookup(token, position == len(tokens) - 1), token, position == len(tokens) - 1) for position, token in enumerate(tokens)]
+            candidates: Optional[Set[int]] = None
+            for ids, token, prefix in sorted(lookups, key=lambda lookup: (not lookup[0], len(lookup[0]))):
+                if not ids:
+                    ids = self._fuzzy(token, fuzzy_distance(token), prefix)
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    break
+            candidates = candidates or set()
+            keys = self._keys
+
+            def rank(item_id: int) -> Tuple[int, int, str, int]:
+                key = keys[item_id]
+                return (0 if key == query or str(item_id) == query else 1 if key.startswith(query) or str(item_id).startswith(query) else 2, len(key), key, item_id)
+
+            return [(item_id, self._names[item_id]) for item_id in nsmallest(limit, candidates, key=rank)]
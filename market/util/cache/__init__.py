@@ -0,0 +1,139 @@
+from typing import TypeVar, Generic, Any, Callable, Dict, Optional, Hashable, NamedTuple, Tuple
+from collections import OrderedDict
+from threading import Event, Lock, RLock
+from time import monotonic, time
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+class CacheEntry(NamedTuple):
+    value: Any
+    created: float
+    fresh_until: float
+    stale_until: float
+
+    @classmethod
+    def create(cls, value: Any, soft_ttl: float, hard_ttl: float) -> "CacheEntry":
+        now = time()
+        return cls(value=value, created=now, fresh_until=now + soft_ttl, stale_until=now + max(soft_ttl, hard_ttl))
+
+    @property
+    def fresh(self) -> bool:
+        return time() < self.fresh_until
+
+    @property
+    def expired(self) -> bool:
+        return time() >= self.stale_until
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data: "OrderedDict[K, Tuple[Optional[float], V]]" = OrderedDict()
+        self._lock = RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return self._data.__len__()
+
+    def __contains__(self, key: K) -> bool:
+        return self._data.__contains__(key)
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return self._ttl
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            if expires is not None and expires <= monotonic():
+                del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        if self._maxsize <= 0:
+            return
+        ttl = self._ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (monotonic() + ttl if ttl is not None else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self._hits,
+            misses=self._misses,
+            maxsize=self._maxsize,
+            currsize=len(self._data)
+        )
+
+class _Flight(object):
+    def __init__(self) -> None:
+        self.done = Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight(Generic[K, V]):
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._flights: Dict[K, _Flight] = {}
+
+    def __len__(self) -> int:
+        return self._flights.__len__()
+
+    def __contains__(self, key: K) -> bool:
+        return self._flights.__contains__(key)
+
+    def do(self, key: K, func: Callable[[], V]) -> Tuple[V, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = func()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, False
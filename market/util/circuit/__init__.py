@@ -0,0 +1,67 @@
+from enum import Enum, unique
+from threading import Lock
+from time import monotonic
+
+@unique
+class CircuitState(str, Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened = 0.0
+        self._state = CircuitState.CLOSED
+        self._probing = False
+        self._lock = Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state is CircuitState.OPEN and monotonic() - self._opened >= self._reset_timeout:
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    @property
+    def enabled(self) -> bool:
+        return self._failure_threshold > 0
+
+    def allow(self) -> bool:
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self._state is CircuitState.CLOSED:
+                return True
+            if self._state is CircuitState.OPEN and monotonic() - self._opened < self._reset_timeout:
+                return False
+            if self._probing:
+                return False
+            self._state = CircuitState.HALF_OPEN
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._state = CircuitState.CLOSED
+
+    def record_failure(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state is CircuitState.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = CircuitState.OPEN
+                self._opened = monotonic()
@@ -0,0 +1,134 @@
+import json
+import zlib
+from abc import ABC, abstractmethod
+from struct import Struct
+from typing import Any, Dict, Optional, Union
+from market.util.cache import CacheEntry
+from market.util.huffman import HuffmanData, encode_huffman
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = 0xBD
+VERSION = 1
+
+LEGACY_STALE_TTL = 60.0
+
+HEADER = Struct('<BBBddd')
+RESULT_CODE = Struct('<i')
+
+class CacheCodec(ABC):
+    name: str = ''
+    codec_id: int = 0
+
+    @abstractmethod
+    def encode_value(self, value: Any) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def decode_value(self, data: memoryview) -> Any:
+        ...
+
+    def encode(self, entry: CacheEntry) -> bytes:
+        codec = self
+        body = self.encode_value(entry.value)
+        if body is None:
+            codec = JSON_CODEC
+            body = codec.encode_value(entry.value)
+        return HEADER.pack(MAGIC, VERSION, codec.codec_id, entry.created, entry.fresh_until, entry.stale_until) + body
+
+class JsonCodec(CacheCodec):
+    name = 'json'
+    codec_id = 0
+
+    def encode_value(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+
+    def decode_value(self, data: memoryview) -> Any:
+        return json.loads(bytes(data))
+
+class ResultCodec(CacheCodec):
+    @abstractmethod
+    def encode_message(self, message: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def decode_message(self, data: memoryview) -> str:
+        ...
+
+    def encode_value(self, value: Any) -> Optional[bytes]:
+        if not isinstance(value, dict) or value.keys() != {'resultCode', 'resultMsg'}:
+            return None
+        if not isinstance(value['resultCode'], int) or not isinstance(value['resultMsg'], str):
+            return None
+        return RESULT_CODE.pack(value['resultCode']) + self.encode_message(value['resultMsg'])
+
+    def decode_value(self, data: memoryview) -> Dict[str, Any]:
+        result_code, = RESULT_CODE.unpack_from(data)
+        return {'resultCode': result_code, 'resultMsg': self.decode_message(data[RESULT_CODE.size:])}
+
+class ZlibCodec(ResultCodec):
+    name = 'zlib'
+    codec_id = 1
+
+    def __init__(self, level: int = 1) -> None:
+        self._level = level
+
+    def encode_message(self, message: str) -> bytes:
+        return zlib.compress(message.encode(), self._level)
+
+    def decode_message(self, data: memoryview) -> str:
+        return zlib.decompress(data).decode()
+
+class HuffmanCodec(ResultCodec):
+    name = 'huffman'
+    codec_id = 2
+
+    def encode_message(self, message: str) -> bytes:
+        return encode_huffman(message)
+
+    def decode_message(self, data: memoryview) -> str:
+        return HuffmanData(data).data
+
+class Lz4Codec(ResultCodec):
+    name = 'lz4'
+    codec_id = 3
+
+    def encode_message(self, message: str) -> bytes:
+        return lz4.frame.compress(message.encode())
+
+    def decode_message(self, data: memoryview) -> str:
+        return lz4.frame.decompress(data).decode()
+
+JSON_CODEC = JsonCodec()
+
+CODECS: Dict[int, CacheCodec] = {
+    codec.codec_id: codec
+    for codec
+    in (JSON_CODEC, ZlibCodec(), HuffmanCodec(), Lz4Codec())
+    if codec.name != 'lz4' or lz4 is not None
+}
+
+def get_codec(name: str, level: Optional[int] = None) -> CacheCodec:
+    if name == 'zlib' and level is not None:
+        return ZlibCodec(level)
+    for codec in CODECS.values():
+        if codec.name == name:
+            return codec
+    raise ValueError(f'Unknown or unavailable cache codec: {name}')
+
+def decode_entry(data: Union[bytes, str]) -> CacheEntry:
+    if isinstance(data, str):
+        data = data.encode()
+    if not data or data[0] != MAGIC:
+        payload = json.loads(data)
+        if 'value' not in payload:
+            return CacheEntry.create(payload, 0, LEGACY_STALE_TTL)
+        return CacheEntry(**payload)
+    magic, version, codec_id, created, fresh_until, stale_until = HEADER.unpack_from(data)
+    if version != VERSION or codec_id not in CODECS:
+        raise ValueError(f'Unsupported cache entry version {version} codec {codec_id}')
+    value = CODECS[codec_id].decode_value(memoryview(data)[HEADER.size:])
+    return CacheEntry(value=value, created=created, fresh_until=fresh_until, stale_until=stale_until)
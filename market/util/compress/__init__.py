@@ -0,0 +1,27 @@
+import gzip
+
+from typing import Dict, Callable, List, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+Compressor = Callable[[bytes, int], bytes]
+
+COMPRESSORS: Dict[str, Compressor] = {
+    'gzip': lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data, level: brotli.compress(data, quality=level)
+
+DEFAULT_LEVELS: Dict[str, int] = {
+    'gzip': 6,
+    'br': 5,
+}
+
+def preferred_encodings() -> List[str]:
+    return [encoding for encoding in ('br', 'gzip') if encoding in COMPRESSORS]
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    return COMPRESSORS[encoding](data, DEFAULT_LEVELS[encoding] if level is None else level)
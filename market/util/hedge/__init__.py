@@ -0,0 +1,42 @@
+from typing import Callable, Deque, Optional, Tuple, TypeVar
+from collections import deque
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from threading import Lock
+
+T = TypeVar('T')
+
+class LatencyWindow(object):
+    def __init__(self, size: int = 256, min_samples: int = 20) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._min_samples = min_samples
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self._min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def hedged_call(executor: Executor, call: Callable[[], T], delay: float, hedge_executor: Optional[Executor] = None) -> Tuple[T, bool, bool]:
+    primary = executor.submit(call)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result(), False, False
+    hedge = (hedge_executor or executor).submit(call)
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), True, future is hedge
+            error = future.exception()
+    raise error
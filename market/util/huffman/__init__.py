@@ -1,15 +1,25 @@
 #reference: https://github.com/shrddr/huffman_heap/
 
-from typing import TypeVar, Any, Optional, Union, Dict, List, Tuple, Collection, Iterator
-from copy import deepcopy
-from io import FileIO, BytesIO
-from struct import calcsize, unpack
-from bitstring import Bits, BitArray
+import os
+from contextlib import contextmanager
+from typing import TypeVar, Any, Optional, Union, Dict, List, Tuple, Collection, Iterable, Iterator, NamedTuple
+from operator import truth
+from collections import Counter
+from hashlib import blake2b
+from io import FileIO, BytesIO, BufferedReader
+from mmap import mmap, ACCESS_READ
+from struct import Struct
 from marshmallow_dataclass import dataclass
 from dataclasses import field
+from market.util.cache import LRUCache, CacheInfo
 
 T = TypeVar('T')
 
+RawData = Union[bytes, bytearray, memoryview, mmap, BytesIO, FileIO]
+
+HEADER = Struct('III')
+SYMBOL = Struct('II')
+
 def group_by_n_elements(dataset: Collection[Any], groupSize) -> Collection[Tuple[Any, ...]]:
     return (dataset[n:n+groupSize] for n in range(0, len(dataset), groupSize))
 
@@ -103,63 +113,229 @@ class HuffmanNode:
             right=other
         )
 
-@dataclass
-class HuffmanData(object):
-    raw_data: Union[bytes, BytesIO, FileIO]
-    data: Any = None
-    frequency: Dict[Any, Any] = None
-    tree: HuffmanNode = None
-    table: Dict[Any, Any] = None
+class HuffmanDecoder(object):
+    def __init__(self, table: Dict[str, Any]) -> None:
+        self._children: List[List[Any]] = [[None, None]]
+        for code, char in table.items():
+            state = 0
+            for bit in map(int, code[:-1]):
+                if not isinstance(self._children[state][bit], int):
+                    self._children[state][bit] = len(self._children)
+                    self._children.append([None, None])
+                state = self._children[state][bit]
+            self._children[state][int(code[-1])] = (char,)
 
-    def _read(cls, file_like_obj: Union[FileIO, BytesIO], fmt: Union[str, bytes]) -> Tuple[Any, ...]:
-        ret = unpack(fmt, file_like_obj.read(calcsize(fmt)))
-        return ret[0] if isinstance(ret, tuple) and len(ret) == 1 else ret
+        nibbles = [
+            [self._walk(state, nibble, 4) for nibble in range(16)]
+            for state in range(len(self._children))
+        ]
+        self._transitions: List[Tuple[str, int]] = []
+        self._byte_transitions: List[Tuple[bytes, int]] = []
+        for state in range(len(self._children)):
+            for high_text, high_state in nibbles[state]:
+                for low_text, low_state in nibbles[high_state]:
+                    text = ''.join(high_text + low_text)
+                    self._transitions.append((text, low_state << 8))
+                    self._byte_transitions.append((text.encode(), low_state << 8))
 
-    def __post_init__(self) -> None:
-        if isinstance(self.raw_data, bytes):
-            self.raw_data = BytesIO(self.raw_data)
+    def _walk(self, state: int, value: int, bits: int) -> Tuple[List[Any], int]:
+        text = []
+        for shift in range(bits - 1, -1, -1):
+            child = self._children[state][(value >> shift) & 1]
+            if isinstance(child, int):
+                state = child
+            else:
+                if child is not None:
+                    text.append(child[0])
+                state = 0
+        return text, state
 
-        self._working_copy_raw_data = deepcopy(self.raw_data)
-        self.frequency = {}
-        self.tree = HuffmanNode()
-        self.table = {}
-        self.data = ''
+    def iter_decode(self, data: Union[bytes, memoryview], bit_length: int, chunk_size: int = 4096) -> Iterator[str]:
+        full_bytes, tail_bits = divmod(min(bit_length, len(data) * 8), 8)
+        transitions = self._transitions
+        view = memoryview(data)
+        state = 0
+        for start in range(0, full_bytes, chunk_size):
+            chunks: List[str] = []
+            append = chunks.append
+            for byte in view[start:min(start + chunk_size, full_bytes)]:
+                text, state = transitions[state | byte]
+                append(text)
+            yield ''.join(chunks)
+        if tail_bits:
+            text, _ = self._walk(state >> 8, view[full_bytes] >> (8 - tail_bits), tail_bits)
+            yield ''.join(text)
 
-        length, always0, chars_count = self._read(self._working_copy_raw_data, 'III')
-        self.frequency = {
+    def decode_into(self, data: Union[bytes, memoryview], bit_length: int, buffer: bytearray, chunk_size: int = 512) -> int:
+        full_bytes, tail_bits = divmod(min(bit_length, len(data) * 8), 8)
+        transitions = self._byte_transitions
+        view = memoryview(data)
+        state = 0
+        position = 0
+        for start in range(0, full_bytes, chunk_size):
+            chunks: List[bytes] = []
+            append = chunks.append
+            for byte in view[start:min(start + chunk_size, full_bytes)]:
+                text, state = transitions[state | byte]
+                append(text)
+            chunk = b''.join(chunks)
+            buffer[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        if tail_bits:
+            text, _ = self._walk(state >> 8, view[full_bytes] >> (8 - tail_bits), tail_bits)
+            chunk = ''.join(text).encode()
+            buffer[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        view.release()
+        return position
+
+    def decode_bytes(self, data: Union[bytes, memoryview], bit_length: int, size: int = 0) -> bytearray:
+        buffer = bytearray(size)
+        del buffer[self.decode_into(data, bit_length, buffer):]
+        return buffer
+
+    def decode(self, data: Union[bytes, memoryview], bit_length: int, size: int = 0) -> str:
+        return self.decode_bytes(data, bit_length, size).decode()
+
+class HuffmanCodebook(NamedTuple):
+    frequency: Dict[Any, Any]
+    tree: Optional[HuffmanNode]
+    table: Dict[Any, Any]
+    decoder: HuffmanDecoder
+
+    @classmethod
+    def from_frequency_block(cls, block: Union[bytes, memoryview]) -> "HuffmanCodebook":
+        frequency = {
             chr(char): count
             for count, char
-            in group_by_n_elements(self._read(self._working_copy_raw_data, 'II' * chars_count), 2)
+            in SYMBOL.iter_unpack(block)
         }
 
         heap: MinHeap[HuffmanNode] = MinHeap(initialHeap=[
-            HuffmanNode(frequency=frequency, char=char)
-            for char, frequency
-            in self.frequency.items()
+            HuffmanNode(frequency=count, char=char)
+            for char, count
+            in frequency.items()
         ])
         while len(heap) > 1:
             heap.push(heap.pop() + heap.pop())
-        self.tree = heap.peek()
+        tree = heap.peek()
 
-        tree_stack: List[Tuple[HuffmanNode, str]] = [(self.tree, '')]
+        table = {}
+        tree_stack: List[Tuple[HuffmanNode, str]] = [(tree, '')] if tree is not None else []
         while tree_stack:
             node, code = tree_stack.pop()
             if node.char is not None:
-                self.table[code] = node.char
+                table[code or '0'] = node.char
             if node.left is not None:
                 tree_stack.append((node.left, code + '0'))
             if node.right is not None:
                 tree_stack.append((node.right, code + '1'))
 
-        packed_bits_length, packed_bytes_length, unpacked_bytes_length = self._read(self._working_copy_raw_data, 'III')
-        data = self._working_copy_raw_data.read(packed_bytes_length)
-        bits = BitArray(bytes=data)[:packed_bits_length]
-        bit_pos_start = 0
-        bit_pos_stop = 1
-        while bit_pos_stop <= len(bits):
-            current_bit = bits[bit_pos_start:bit_pos_stop]
-            lookup = self.table.get(current_bit.bin)
-            if lookup:
-                self.data += lookup
-                bit_pos_start = bit_pos_stop
-            bit_pos_stop += 1
\ No newline at end of file
+        return cls(frequency=frequency, tree=tree, table=table, decoder=HuffmanDecoder(table))
+
+codebook_cache: LRUCache[bytes, HuffmanCodebook] = LRUCache(maxsize=int(os.getenv('HUFFMAN_CACHE_SIZE', 256)))
+
+def codebook_cache_info() -> CacheInfo:
+    return codebook_cache.info()
+
+def get_codebook(block: Union[bytes, memoryview]) -> HuffmanCodebook:
+    key = blake2b(block, digest_size=16).digest()
+    codebook = codebook_cache.get(key)
+    if codebook is None:
+        codebook = HuffmanCodebook.from_frequency_block(block)
+        codebook_cache.set(key, codebook)
+    return codebook
+
+def split_records(chunks: Iterable[str], separator: str = '|') -> Iterator[str]:
+    pending = ''
+    for chunk in chunks:
+        *records, pending = (pending + chunk).split(separator)
+        yield from filter(truth, records)
+    if pending:
+        yield pending
+
+class HuffmanPayload(NamedTuple):
+    codebook: HuffmanCodebook
+    data: memoryview
+    bit_length: int
+    size: int
+
+@contextmanager
+def _open_view(raw_data: RawData) -> Iterator[memoryview]:
+    if isinstance(raw_data, BytesIO):
+        view = memoryview(raw_data.getbuffer())[raw_data.tell():]
+        try:
+            yield view
+        finally:
+            view.release()
+    elif isinstance(raw_data, (FileIO, BufferedReader)):
+        offset = raw_data.tell()
+        if os.fstat(raw_data.fileno()).st_size <= offset:
+            yield memoryview(b'')
+            return
+        with mmap(raw_data.fileno(), 0, access=ACCESS_READ) as mapped:
+            view = memoryview(mapped)[offset:]
+            try:
+                yield view
+            finally:
+                view.release()
+    else:
+        yield memoryview(raw_data).cast('B')
+
+def _parse(view: memoryview) -> HuffmanPayload:
+    if not view:
+        return HuffmanPayload(get_codebook(b''), view, 0, 0)
+    length, always0, chars_count = HEADER.unpack_from(view, 0)
+    offset = HEADER.size
+    codebook = get_codebook(view[offset:offset + SYMBOL.size * chars_count])
+    offset += SYMBOL.size * chars_count
+    packed_bits_length, packed_bytes_length, unpacked_bytes_length = HEADER.unpack_from(view, offset)
+    offset += HEADER.size
+    return HuffmanPayload(codebook, view[offset:offset + packed_bytes_length], packed_bits_length, unpacked_bytes_length)
+
+def encode_huffman(text: str) -> bytes:
+    block = b''.join(SYMBOL.pack(count, ord(char)) for char, count in sorted(Counter(text).items()))
+    codes = {char: code for code, char in get_codebook(block).table.items()}
+    bits = ''.join(map(codes.__getitem__, text))
+    padding = -len(bits) % 8
+    packed = (int(bits, 2) << padding).to_bytes((len(bits) + padding) // 8, 'big') if bits else b''
+    header = HEADER.pack(len(bits), len(packed), len(text))
+    return HEADER.pack(HEADER.size + len(block) + len(header) + len(packed), 0, len(block) // SYMBOL.size) + block + header + packed
+
+def iter_huffman_chunks(raw_data: RawData, chunk_size: int = 4096) -> Iterator[str]:
+    with _open_view(raw_data) as view:
+        payload = _parse(view)
+        try:
+            yield from payload.codebook.decoder.iter_decode(payload.data, payload.bit_length, chunk_size)
+        finally:
+            payload.data.release()
+
+def decode_huffman_bytes(raw_data: RawData) -> bytearray:
+    with _open_view(raw_data) as view:
+        payload = _parse(view)
+        try:
+            return payload.codebook.decoder.decode_bytes(payload.data, payload.bit_length, payload.size)
+        finally:
+            payload.data.release()
+
+def iter_huffman_records(raw_data: RawData, separator: str = '|', chunk_size: int = 4096) -> Iterator[str]:
+    return split_records(iter_huffman_chunks(raw_data, chunk_size), separator)
+
+@dataclass
+class HuffmanData(object):
+    raw_data: RawData
+    data: Any = None
+    frequency: Dict[Any, Any] = None
+    tree: HuffmanNode = None
+    table: Dict[Any, Any] = None
+
+    def __post_init__(self) -> None:
+        with _open_view(self.raw_data) as view:
+            payload = _parse(view)
+            try:
+                self.data = payload.codebook.decoder.decode(payload.data, payload.bit_length, payload.size)
+            finally:
+                payload.data.release()
+        self.frequency = dict(payload.codebook.frequency)
+        self.tree = payload.codebook.tree
+        self.table = dict(payload.codebook.table)
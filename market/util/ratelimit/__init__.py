@@ -0,0 +1,109 @@
+from typing import Optional
+from threading import Condition, Lock
+from time import monotonic, sleep
+
+class TokenBucket(object):
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self._capacity
+        self._updated = monotonic()
+        self._waiting = 0
+        self._lock = Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def _take(self, tokens: float) -> float:
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self._rate
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        return self._rate <= 0 or self._take(tokens) == 0.0
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        if self._rate <= 0:
+            return True
+        deadline = None if timeout is None else monotonic() + timeout
+        wait = self._take(tokens)
+        if wait == 0.0:
+            return True
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                if deadline is not None and monotonic() + wait > deadline:
+                    return False
+                sleep(wait)
+                wait = self._take(tokens)
+                if wait == 0.0:
+                    return True
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+class LimitExceeded(Exception):
+    pass
+
+class AIMDLimit(object):
+    def __init__(self, initial: float = 4, minimum: float = 1, maximum: float = 64, increase: float = 1.0, decrease: float = 0.5) -> None:
+        self._minimum = minimum
+        self._maximum = max(minimum, maximum)
+        self._limit = min(self._maximum, max(minimum, initial))
+        self._increase = increase
+        self._decrease = decrease
+        self._in_flight = 0
+        self._waiting = 0
+        self._decreased = 0.0
+        self._condition = Condition()
+
+    @property
+    def limit(self) -> float:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[float]:
+        with self._condition:
+            if self._in_flight >= int(self._limit):
+                self._waiting += 1
+                try:
+                    if not self._condition.wait_for(lambda: self._in_flight < int(self._limit), timeout):
+                        return None
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+            return monotonic()
+
+    def release(self, started: float, overloaded: bool = False) -> None:
+        with self._condition:
+            saturated = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+            if overloaded:
+                if started > self._decreased:
+                    self._limit = max(self._minimum, self._limit * self._decrease)
+                    self._decreased = monotonic()
+            elif saturated:
+                self._limit = min(self._maximum, self._limit + self._increase / self._limit)
+            self._condition.notify_all()
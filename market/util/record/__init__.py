@@ -0,0 +1,40 @@
+from operator import truth
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Record = Tuple[int, ...]
+
+class RecordFormat(object):
+    def __init__(self, fields: Tuple[str, ...], aliases: Optional[Dict[str, str]] = None, field_separator: str = '-', record_separator: str = '|') -> None:
+        self._fields = fields
+        self._aliases = dict(aliases or {})
+        self._field_separator = field_separator
+        self._record_separator = record_separator
+        index = {name: position for position, name in enumerate(fields)}
+        index.update({alias: index[name] for alias, name in self._aliases.items()})
+        self._template = '{{' + ','.join(f'"{name}":{{{index[name]}}}' for name in sorted(index)) + '}}'
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return self._fields
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self._fields + tuple(self._aliases)
+
+    def index(self, name: str) -> int:
+        return self._fields.index(self._aliases.get(name, name))
+
+    def parse(self, text: str) -> List[Record]:
+        return self.parse_records(filter(truth, text.split(self._record_separator)))
+
+    def parse_records(self, records: Iterable[str]) -> List[Record]:
+        width = len(self._fields)
+        separator = self._field_separator
+        return [tuple(map(int, record.split(separator, width)[:width])) for record in records]
+
+    def to_dict(self, record: Record) -> Dict[str, int]:
+        return {name: record[self.index(name)] for name in self.names}
+
+    def serialize(self, records: Iterable[Record]) -> str:
+        template = self._template
+        return '[' + ','.join([template.format(*record) for record in records]) + ']'
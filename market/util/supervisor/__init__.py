@@ -0,0 +1,99 @@
+import logging
+
+from typing import Callable, Dict, List, Optional
+from threading import Condition, Thread
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+class Service(object):
+    def __init__(self, name: str, run: Callable[[], None], stop: Optional[Callable[[], None]] = None) -> None:
+        self.name = name
+        self.run = run
+        self.stop = stop if stop is not None else (lambda: None)
+        self.restarts = 0
+        self.thread: Optional[Thread] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+class Supervisor(object):
+    def __init__(self, max_restarts: int = 3, backoff: float = 1.0, max_backoff: float = 60.0, reset_after: float = 300.0) -> None:
+        self._services: Dict[str, Service] = {}
+        self._max_restarts = max_restarts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._reset_after = reset_after
+        self._condition = Condition()
+        self._exited: List[Service] = []
+        self._stopping = False
+
+    def add(self, name: str, run: Callable[[], None], stop: Optional[Callable[[], None]] = None) -> Service:
+        service = self._services[name] = Service(name, run, stop)
+        return service
+
+    @property
+    def services(self) -> List[Service]:
+        return list(self._services.values())
+
+    def _start(self, service: Service) -> None:
+        def target() -> None:
+            started = monotonic()
+            try:
+                service.run()
+            except Exception:
+                logger.exception('Service %s crashed', service.name)
+            else:
+                if not self._stopping:
+                    logger.warning('Service %s exited', service.name)
+            if monotonic() - started >= self._reset_after:
+                service.restarts = 0
+            with self._condition:
+                self._exited.append(service)
+                self._condition.notify_all()
+
+        service.thread = Thread(name=service.name, target=target, daemon=True)
+        service.thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+        for service in self._services.values():
+            try:
+                service.stop()
+            except Exception:
+                logger.exception('Stopping service %s failed', service.name)
+
+    def run(self) -> int:
+        for service in self._services.values():
+            self._start(service)
+        pending: Dict[str, float] = {}
+        failed: Optional[Service] = None
+        with self._condition:
+            while not self._stopping and failed is None:
+                if not self._exited:
+                    self._condition.wait(max(0.0, min(pending.values()) - monotonic()) if pending else None)
+                while self._exited and not self._stopping:
+                    service = self._exited.pop()
+                    if service.restarts >= self._max_restarts:
+                        failed = service
+                        break
+                    delay = min(self._max_backoff, self._backoff * 2 ** service.restarts)
+                    service.restarts += 1
+                    logger.info('Restarting service %s in %.1fs (attempt %d)', service.name, delay, service.restarts)
+                    pending[service.name] = monotonic() + delay
+                for name, due in list(pending.items()):
+                    if due <= monotonic() and not self._stopping and failed is None:
+                        del pending[name]
+                        self._start(self._services[name])
+        if failed is not None:
+            logger.error('Service %s exceeded %d restarts, shutting down', failed.name, self._max_restarts)
+        self.stop()
+        for service in self._services.values():
+            if service.thread is not None:
+                service.thread.join(10)
+        return 1 if failed is not None else 0
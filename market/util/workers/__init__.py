@@ -0,0 +1,102 @@
+import os
+import signal
+import socket
+import logging
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from subprocess import Popen, TimeoutExpired
+from threading import Condition, Thread
+from time import monotonic, sleep
+
+logger = logging.getLogger(__name__)
+
+class WorkerProcesses(object):
+    def __init__(self, command: Sequence[str], workers: Optional[int] = None, env: Optional[Mapping[str, str]] = None, shutdown_timeout: float = 10.0, backoff: float = 1.0, grace: float = 2.0) -> None:
+        self._command = list(command)
+        self._workers = workers if workers is not None and workers > 0 else (os.cpu_count() or 1)
+        self._env = dict(env) if env is not None else None
+        self._shutdown_timeout = shutdown_timeout
+        self._backoff = backoff
+        self._grace = grace
+        self._children: Dict[int, Tuple[Popen, int, float]] = {}
+        self._exited: List[Popen] = []
+        self._condition = Condition()
+        self._generation = 0
+        self._stopping = False
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def pids(self) -> List[int]:
+        with self._condition:
+            return list(self._children)
+
+    def _watch(self, process: Popen) -> None:
+        process.wait()
+        with self._condition:
+            self._exited.append(process)
+            self._condition.notify_all()
+
+    def _spawn(self) -> Popen:
+        process = Popen(self._command, env=self._env)
+        self._children[process.pid] = (process, self._generation, monotonic())
+        Thread(name=f'worker-{process.pid}', target=self._watch, args=(process,), daemon=True).start()
+        logger.info('Started worker %d (generation %d)', process.pid, self._generation)
+        return process
+
+    def reload(self) -> None:
+        with self._condition:
+            if self._stopping:
+                return
+            retired = [process for process, _, _ in self._children.values()]
+            self._generation += 1
+            for _ in range(self._workers):
+                self._spawn()
+        sleep(self._grace)
+        for process in retired:
+            process.send_signal(signal.SIGTERM)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            processes = [process for process, _, _ in self._children.values()]
+            self._condition.notify_all()
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        for process in processes:
+            try:
+                process.wait(self._shutdown_timeout)
+            except TimeoutExpired:
+                logger.warning('Worker %d did not stop in %.0fs, killing it', process.pid, self._shutdown_timeout)
+                process.kill()
+
+    def run(self) -> None:
+        with self._condition:
+            self._stopping = False
+            for _ in range(self._workers):
+                self._spawn()
+            while self._children:
+                if not self._exited:
+                    self._condition.wait()
+                while self._exited:
+                    process = self._exited.pop()
+                    _, generation, started = self._children.pop(process.pid)
+                    if self._stopping or generation != self._generation:
+                        continue
+                    logger.warning('Worker %d exited with status %d, restarting', process.pid, process.returncode)
+                    if monotonic() - started < self._backoff:
+                        self._condition.wait(self._backoff)
+                    if not self._stopping:
+                        self._spawn()
+
+def bind_listener(listener: Tuple[str, int], reuse_port: bool = False, backlog: int = 1024) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(listener)
+    sock.listen(backlog)
+    return sock
@@ -0,0 +1,84 @@
+import pytest
+from market.util.huffman import encode_huffman
+from tests.helpers import market_list_text, market_sub_list_text, bidding_info_text
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    if not (config.getoption('benchmark_only') or config.getoption('benchmark_enable')):
+        config.option.benchmark_skip = True
+
+@pytest.fixture(scope='session')
+def market_list_payload() -> bytes:
+    return encode_huffman(market_list_text(5000))
+
+@pytest.fixture(scope='session')
+def market_sub_list_payload() -> bytes:
+    return encode_huffman(market_sub_list_text(2000))
+
+@pytest.fixture(scope='session')
+def bidding_info_payload() -> bytes:
+    return encode_huffman(bidding_info_text(5000))
+
+class FakeResponse(object):
+    def __init__(self, result_msg: str) -> None:
+        self._result = {'resultCode': 0, 'resultMsg': result_msg}
+
+    def json(self):
+        return dict(self._result)
+
+@pytest.fixture
+def upstream(monkeypatch):
+    from market.api import MarketAPI
+    responses = {}
+    calls = []
+
+    def request(self, url, **kwargs):
+        calls.append((self.region, url, kwargs.get('json')))
+        return FakeResponse(responses[url.rsplit('/', 1)[-1]])
+
+    monkeypatch.setattr(MarketAPI, 'request', request)
+    responses['calls'] = calls
+    return responses
+
+@pytest.fixture
+def client():
+    from market import web_app
+    return web_app.test_client()
+
+class FakeLock(object):
+    def __init__(self, redis, name) -> None:
+        self._redis = redis
+        self._name = name
+
+    def acquire(self):
+        return bool(self._redis.set(self._name, b'1', nx=True))
+
+    def release(self):
+        self._redis.delete(self._name)
+
+class FakeRedis(object):
+    def __init__(self) -> None:
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None, px=None, nx=False, get=False):
+        previous = self.data.get(name)
+        if nx and previous is not None:
+            return None
+        self.data[name] = value if isinstance(value, bytes) else str(value).encode()
+        return previous if get else True
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def delete(self, *names):
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+    def lock(self, name, timeout=None, blocking=True):
+        return FakeLock(self, name)
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
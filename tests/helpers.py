@@ -0,0 +1,22 @@
+from random import Random
+
+def market_list_text(records: int, seed: int = 0) -> str:
+    random = Random(seed)
+    return ''.join(
+        f'{random.randint(10000, 800000)}-{random.randint(0, 5000)}-{random.randint(0, 10 ** 8)}-{random.randint(100, 10 ** 9)}|'
+        for _ in range(records)
+    )
+
+def market_sub_list_text(records: int, seed: int = 0) -> str:
+    random = Random(seed)
+    return ''.join(
+        f'{random.randint(10000, 800000)}-{enhancement}-{enhancement}-{price}-{random.randint(0, 5000)}-{random.randint(0, 10 ** 8)}-{price // 2}-{price * 2}-{price}-{random.randint(1600000000, 1800000000)}|'
+        for enhancement, price in ((random.randint(0, 20), random.randint(100, 10 ** 9)) for _ in range(records))
+    )
+
+def bidding_info_text(records: int, seed: int = 0) -> str:
+    random = Random(seed)
+    return ''.join(
+        f'{price}-{random.randint(0, 500)}-{random.randint(0, 500)}|'
+        for price in sorted(random.sample(range(100, 10 ** 9), records))
+    )
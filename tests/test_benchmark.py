@@ -0,0 +1,104 @@
+import json
+import pytest
+from market.model import ResponseItems, ResponseItemsFormat, ResponseItem, ResponseItemFormat, ResponseItemBidding, ResponseItemBiddingFormat
+from market.util.huffman import HuffmanData
+from market.util.cache import CacheEntry
+from market.util.codec import CODECS, decode_entry
+from random import Random
+from market.enum import MarketRegion, MoversMetric
+from market.movers import MoversIndex
+from market.orderbook import order_book_stats, parse_orders
+from market.search import SearchIndex
+from tests.helpers import bidding_info_text
+
+ENDPOINTS = [
+    ('GetWorldMarketList', 'market_list_payload', ResponseItems),
+    ('GetWorldMarketSubList', 'market_sub_list_payload', ResponseItem),
+    ('GetBiddingInfoList', 'bidding_info_payload', ResponseItemBidding),
+]
+
+FORMATS = [
+    ('GetWorldMarketList', 'market_list_payload', ResponseItemsFormat),
+    ('GetWorldMarketSubList', 'market_sub_list_payload', ResponseItemFormat),
+    ('GetBiddingInfoList', 'bidding_info_payload', ResponseItemBiddingFormat),
+]
+
+def report_throughput(benchmark, size: int, records: int) -> None:
+    if benchmark.stats:
+        mean = benchmark.stats.stats.mean
+        benchmark.extra_info['MB/s'] = round(size / mean / 1e6, 3)
+        benchmark.extra_info['records/s'] = round(records / mean)
+
+@pytest.mark.parametrize('endpoint, payload, model', ENDPOINTS, ids=[endpoint for endpoint, *_ in ENDPOINTS])
+def test_decode(benchmark, request, endpoint, payload, model):
+    raw_data = request.getfixturevalue(payload)
+    data = benchmark(HuffmanData, raw_data).data
+    report_throughput(benchmark, len(data), data.count('|'))
+
+@pytest.mark.parametrize('endpoint, payload, model', ENDPOINTS, ids=[endpoint for endpoint, *_ in ENDPOINTS])
+def test_parse(benchmark, request, endpoint, payload, model):
+    result = {'resultCode': 0, 'resultMsg': HuffmanData(request.getfixturevalue(payload)).data}
+    items = benchmark(model.Schema(many=True).load, result)
+    report_throughput(benchmark, len(result['resultMsg']), len(items))
+
+@pytest.mark.parametrize('endpoint, payload, model', ENDPOINTS, ids=[endpoint for endpoint, *_ in ENDPOINTS])
+def test_serialize(benchmark, request, endpoint, payload, model):
+    result = {'resultCode': 0, 'resultMsg': HuffmanData(request.getfixturevalue(payload)).data}
+    schema = model.Schema(many=True)
+    body = benchmark(lambda: json.dumps(schema.dump(result)))
+    report_throughput(benchmark, len(body), len(json.loads(body)))
+
+@pytest.mark.parametrize('endpoint, payload, record_format', FORMATS, ids=[endpoint for endpoint, *_ in FORMATS])
+def test_fast_parse(benchmark, request, endpoint, payload, record_format):
+    text = HuffmanData(request.getfixturevalue(payload)).data
+    records = benchmark(record_format.parse, text)
+    report_throughput(benchmark, len(text), len(records))
+
+@pytest.mark.parametrize('endpoint, payload, record_format', FORMATS, ids=[endpoint for endpoint, *_ in FORMATS])
+def test_fast_serialize(benchmark, request, endpoint, payload, record_format):
+    text = HuffmanData(request.getfixturevalue(payload)).data
+    records = record_format.parse(text)
+    body = benchmark(record_format.serialize, records)
+    report_throughput(benchmark, len(body), len(records))
+
+@pytest.mark.parametrize('codec', CODECS.values(), ids=[codec.name for codec in CODECS.values()])
+@pytest.mark.parametrize('endpoint, payload, model', ENDPOINTS, ids=[endpoint for endpoint, *_ in ENDPOINTS])
+def test_codec_encode(benchmark, request, endpoint, payload, model, codec):
+    text = HuffmanData(request.getfixturevalue(payload)).data
+    entry = CacheEntry.create({'resultCode': 0, 'resultMsg': text}, 300, 900)
+    data = benchmark(codec.encode, entry)
+    benchmark.extra_info['bytes'] = len(data)
+    benchmark.extra_info['ratio'] = round(len(data) / len(text), 3)
+    report_throughput(benchmark, len(text), text.count('|'))
+
+@pytest.mark.parametrize('codec', CODECS.values(), ids=[codec.name for codec in CODECS.values()])
+@pytest.mark.parametrize('endpoint, payload, model', ENDPOINTS, ids=[endpoint for endpoint, *_ in ENDPOINTS])
+def test_codec_decode(benchmark, request, endpoint, payload, model, codec):
+    text = HuffmanData(request.getfixturevalue(payload)).data
+    data = codec.encode(CacheEntry.create({'resultCode': 0, 'resultMsg': text}, 300, 900))
+    benchmark(decode_entry, data)
+    benchmark.extra_info['bytes'] = len(data)
+    report_throughput(benchmark, len(text), text.count('|'))
+
+def test_order_book_stats(benchmark):
+    texts = [bidding_info_text(40, seed) for seed in range(100)]
+    benchmark(lambda: order_book_stats([parse_orders(text) for text in texts]))
+    report_throughput(benchmark, sum(map(len, texts)), 40 * len(texts))
+
+def test_movers_top(benchmark):
+    random = Random(0)
+    index = MoversIndex()
+    index.update(MarketRegion.NA, [(item_id, random.randrange(100), random.randrange(10 ** 6), random.randrange(1, 10 ** 9)) for item_id in range(20000)])
+    index.update(MarketRegion.NA, [(item_id, random.randrange(100), random.randrange(10 ** 6), random.randrange(1, 10 ** 9)) for item_id in range(0, 20000, 3)])
+    benchmark(index.top, MarketRegion.NA, MoversMetric.PRICE_PCT, 50)
+
+SEARCH_WORDS = ['black', 'stone', 'kzarka', 'longsword', 'crystal', 'shard', 'caphras', 'elixir', 'memory', 'fragment', 'ancient', 'spirit', 'dust', 'blessed', 'hunter', 'seal']
+
+@pytest.fixture(scope='module')
+def search_index():
+    random = Random(0)
+    return SearchIndex({item_id: ' '.join(random.sample(SEARCH_WORDS, 3)) for item_id in range(30000)})
+
+@pytest.mark.parametrize('query', ['kzarka long', 'ancinet sprit', '12345'])
+def test_search(benchmark, search_index, query):
+    assert benchmark(search_index.search, query)
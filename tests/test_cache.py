@@ -0,0 +1,179 @@
+import json
+import pytest
+from threading import Event, Thread, Timer
+from time import monotonic, sleep
+from market.api import MarketAPI, MarketAPIManager
+from market.enum import MarketRegion
+from market.util.cache import CacheEntry, LRUCache
+from market.util.codec import CODECS, decode_entry
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.info().hits == 2
+
+def test_lru_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('market.util.cache.monotonic', lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    now[0] += 11
+    assert cache.get('a') is None
+    assert cache.info().misses == 1
+
+def test_local_cache_in_front_of_redis(upstream, redis):
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    api = MarketAPI(MarketRegion.NA, redis, LRUCache(maxsize=8))
+    first = api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    redis.data.clear()
+    assert api.GetWorldMarketList(mainCategory=1, subCategory=1) == first
+    assert len(upstream['calls']) == 1
+
+def test_local_cache_without_redis(upstream, monkeypatch):
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    monkeypatch.delenv('REDIS_CLUSTER_URL', raising=False)
+    upstream['GetBiddingInfoList'] = '100-1-0|'
+    api = MarketAPI(MarketRegion.EU, local_cache=LRUCache(maxsize=8))
+    api.GetBiddingInfoList(mainKey=1, subKey=0)
+    api.GetBiddingInfoList(mainKey=1, subKey=0)
+    assert len(upstream['calls']) == 1
+
+def test_single_flight_local(upstream):
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    release = Event()
+    request = MarketAPI.request
+    def slow_request(self, **kwargs):
+        release.wait(5)
+        return request(self, **kwargs)
+    api = MarketAPI(MarketRegion.NA)
+    api.request = slow_request.__get__(api)
+    results = []
+    threads = [Thread(target=lambda: results.append(api.GetWorldMarketSubList(mainKey=1))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while len(api._single_flight) == 0:
+        sleep(0.01)
+    sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 8
+    assert len(upstream['calls']) == 1
+
+def test_single_flight_remote(upstream, redis):
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    name = 'NA_GetWorldMarketSubList__1'
+    assert redis.lock(f'{name}_lock').acquire()
+    Timer(0.1, lambda: redis.set(name, json.dumps({'resultCode': 0, 'resultMsg': 'shared'}))).start()
+    assert api.GetWorldMarketSubList(mainKey=1)['resultMsg'] == 'shared'
+    assert upstream['calls'] == []
+
+def wait_for(condition, timeout=5):
+    deadline = monotonic() + timeout
+    while not condition() and monotonic() < deadline:
+        sleep(0.01)
+    return condition()
+
+def test_stale_while_revalidate(upstream, redis, monkeypatch):
+    monkeypatch.setenv('CACHE_SOFT_TTL', '0')
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    upstream['GetWorldMarketList'] = '1-2-3-5|'
+    assert api.GetWorldMarketList(mainCategory=1, subCategory=1)['resultMsg'] == '1-2-3-4|'
+    assert wait_for(lambda: len(upstream['calls']) == 2 and not api._single_flight)
+    assert decode_entry(redis.get('NA_GetWorldMarketList__1_1')).value['resultMsg'] == '1-2-3-5|'
+
+def test_stale_local_entry_adopts_newer_shared_entry(upstream, redis, monkeypatch):
+    monkeypatch.setenv('CACHE_SOFT_TTL', '0')
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    first, second = MarketAPI(MarketRegion.NA, redis, LRUCache(maxsize=8)), MarketAPI(MarketRegion.NA, redis, LRUCache(maxsize=8))
+    first.GetWorldMarketList(mainCategory=1, subCategory=1)
+    upstream['GetWorldMarketList'] = '1-2-3-5|'
+    assert second.GetWorldMarketList(mainCategory=1, subCategory=1)['resultMsg'] == '1-2-3-4|'
+    assert wait_for(lambda: len(upstream['calls']) == 2 and not second._refreshing)
+    assert first.GetWorldMarketList(mainCategory=1, subCategory=1)['resultMsg'] == '1-2-3-4|'
+    assert wait_for(lambda: not first._refreshing)
+    assert len(upstream['calls']) == 2
+    assert first._local_cache.get('NA_GetWorldMarketList__1_1').value['resultMsg'] == '1-2-3-5|'
+
+def test_refresh_ahead(upstream, redis, monkeypatch):
+    monkeypatch.setenv('REFRESH_AHEAD_MIN_HITS', '3')
+    monkeypatch.setenv('REFRESH_AHEAD_RATIO', '1.0')
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    for _ in range(3):
+        api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    assert len(upstream['calls']) == 1
+    api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    assert wait_for(lambda: len(upstream['calls']) == 2)
+
+def test_failed_refresh_backs_off(upstream, redis, monkeypatch):
+    monkeypatch.setenv('CACHE_SOFT_TTL', '0')
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    del upstream['GetWorldMarketList']
+    api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    assert wait_for(lambda: len(upstream['calls']) == 2 and not api._refreshing)
+    for _ in range(3):
+        assert api.GetWorldMarketList(mainCategory=1, subCategory=1)['resultMsg'] == '1-2-3-4|'
+    sleep(0.05)
+    assert len(upstream['calls']) == 2
+
+def test_many_resolves_hits_with_one_mget(upstream, redis, monkeypatch):
+    upstream['GetBiddingInfoList'] = '100-1-0|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    api.GetBiddingInfoList(mainKey=1, subKey=0)
+    mget = redis.mget
+    batches = []
+    monkeypatch.setattr(redis, 'mget', lambda keys: batches.append(keys) or mget(keys), raising=False)
+    results = MarketAPI.GetBiddingInfoList.many(api, [{'mainKey': 1, 'subKey': 0}, {'mainKey': 2, 'subKey': 0}])
+    assert [result['resultMsg'] for result in results] == ['100-1-0|', '100-1-0|']
+    assert batches == [['NA_GetBiddingInfoList__1_0', 'NA_GetBiddingInfoList__2_0']]
+    assert len(upstream['calls']) == 2
+
+def test_manager_creates_clients_lazily_with_shared_cache(redis):
+    manager = MarketAPIManager(cache=redis)
+    assert manager._apis == {}
+    api = manager.api(MarketRegion.EU)
+    assert manager.api(MarketRegion.EU) is api
+    assert list(manager._apis) == [MarketRegion.EU]
+    assert all(api._cache is redis for api in manager.apis.values())
+
+@pytest.mark.parametrize('codec', CODECS.values(), ids=[codec.name for codec in CODECS.values()])
+def test_codec_round_trip(codec):
+    entry = CacheEntry.create({'resultCode': 0, 'resultMsg': '53801-198-55428-4050|53802-0-17725-70000|'}, 300, 900)
+    assert decode_entry(codec.encode(entry)) == entry
+    other = CacheEntry.create({'resultCode': 0, 'resultMsg': 'x', 'extra': [1]}, 300, 900)
+    assert decode_entry(codec.encode(other)) == other
+
+def test_redis_errors_fall_back_to_upstream(upstream, redis, monkeypatch):
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from market.metrics import redis_errors
+    def broken(*args, **kwargs):
+        raise RedisConnectionError('redis is down')
+    for operation in ('get', 'set'):
+        monkeypatch.setattr(redis, operation, broken)
+    before = redis_errors.labels('get')._value.get()
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    assert api.GetWorldMarketSubList(mainKey=7)['resultMsg'] == '1-0-0-1-1-1-1-1-1-1|'
+    assert redis_errors.labels('get')._value.get() == before + 1
+    assert redis_errors.labels('set')._value.get() >= 1
+
+def test_redis_pool_collector_skips_unknown_pools():
+    from math import isnan
+    from types import SimpleNamespace
+    from market.metrics import RedisPoolCollector
+    collector = RedisPoolCollector()
+    collector.register_client('odd', SimpleNamespace(connection_pool=SimpleNamespace(max_connections=4)))
+    samples = {metric.name: metric.samples[0].value for metric in collector.collect()}
+    assert samples['market_redis_pool_max_connections'] == 4
+    assert isnan(samples['market_redis_pool_connections'])
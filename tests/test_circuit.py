@@ -0,0 +1,80 @@
+import pytest
+from time import sleep
+from threading import current_thread
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ConnectionError
+from market.api import MarketAPI
+from market.enum import MarketRegion
+from market.util.circuit import CircuitBreaker, CircuitOpen, CircuitState
+from market.util.hedge import LatencyWindow, hedged_call
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN and not breaker.allow()
+    sleep(0.06)
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state is CircuitState.CLOSED and breaker.allow()
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=100, min_samples=10)
+    assert window.percentile(0.9) is None
+    for value in range(100):
+        window.observe(value / 100)
+    assert window.percentile(0.9) == 0.9
+
+def test_hedged_call_takes_the_faster_copy():
+    calls = []
+    def call():
+        calls.append(len(calls))
+        sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+    with ThreadPoolExecutor(4) as executor:
+        assert hedged_call(executor, call, 0.05) == (2, True, True)
+        calls.clear()
+        assert hedged_call(executor, lambda: 'fast', 0.05) == ('fast', False, False)
+
+def test_hedged_call_runs_hedges_on_their_own_executor():
+    threads = []
+    def call():
+        threads.append(current_thread().name)
+        sleep(0.5 if len(threads) == 1 else 0.01)
+        return len(threads)
+    with ThreadPoolExecutor(1, thread_name_prefix='primary') as executor, ThreadPoolExecutor(1, thread_name_prefix='hedge') as hedge_executor:
+        assert hedged_call(executor, call, 0.05, hedge_executor) == (2, True, True)
+    assert threads[0].startswith('primary') and threads[1].startswith('hedge')
+
+def test_hedge_executors_start_only_with_hedging(upstream, monkeypatch):
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    api = MarketAPI(MarketRegion.NA)
+    api.GetWorldMarketList(mainCategory=1, subCategory=1)
+    assert api._hedge_executors is None
+    monkeypatch.setenv('HEDGE_PERCENTILE', '0.9')
+    api.GetWorldMarketSubList(mainKey=1)
+    assert api._hedge_executors is not None
+
+def test_circuit_opens_per_method_and_falls_back_to_expired_entry(upstream, redis, monkeypatch):
+    monkeypatch.setenv('CACHE_SOFT_TTL', '0')
+    monkeypatch.setenv('CACHE_HARD_TTL', '0')
+    monkeypatch.setenv('CIRCUIT_FAILURES_GETWORLDMARKETLIST', '1')
+    upstream['GetWorldMarketList'] = '1-2-3-4|'
+    api = MarketAPI(MarketRegion.NA, redis)
+    assert api.GetWorldMarketList(mainCategory=1, subCategory=1)['resultMsg'] == '1-2-3-4|'
+    def down(self, **kwargs):
+        raise ConnectionError('down')
+    monkeypatch.setattr(MarketAPI, 'request', down)
+    assert api.GetWorldMarketList(mainCategory=1, subCategory=1)['resultMsg'] == '1-2-3-4|'
+    assert api.policy('GetWorldMarketList').breaker.state is CircuitState.OPEN
+    assert api.policy('GetWorldMarketSubList').breaker.state is CircuitState.CLOSED
+    with pytest.raises(CircuitOpen):
+        api.GetWorldMarketList(mainCategory=2, subCategory=1)
+    with pytest.raises(ConnectionError):
+        api.GetWorldMarketSubList(mainKey=1)
@@ -0,0 +1,34 @@
+from market.api import MarketAPIManager
+from market.crawler import MarketCrawler, load_categories
+from market.enum import MarketRegion
+from market.util.ratelimit import TokenBucket
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1000, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.acquire(timeout=1)
+
+def test_load_categories(tmp_path):
+    path = tmp_path / 'categories.yml'
+    path.write_text('25: [1, 2]\n35: [4]\n')
+    assert load_categories(str(path)) == {25: (1, 2), 35: (4,)}
+
+def test_crawl_follows_changed_items(upstream, redis):
+    upstream['GetWorldMarketList'] = '10-1-5-100|20-0-7-200|'
+    upstream['GetWorldMarketSubList'] = '10-0-0-100-1-5-90-110-100-0|'
+    upstream['GetBiddingInfoList'] = '100-1-0|'
+    manager = MarketAPIManager(cache=redis)
+    crawler = MarketCrawler(manager, categories={25: (1,)}, regions=[MarketRegion.NA], rate=0)
+
+    assert crawler.crawl() == {MarketRegion.NA: [10, 20]}
+    methods = [url for _, url, _ in upstream['calls']]
+    assert methods.count('Trademarket/GetWorldMarketSubList') == 2
+    assert methods.count('Trademarket/GetBiddingInfoList') == 2
+    assert redis.get('NA_GetWorldMarketList__25_1') is not None
+
+    upstream['calls'].clear()
+    upstream['GetWorldMarketList'] = '10-1-5-100|20-1-7-200|'
+    assert crawler.crawl() == {MarketRegion.NA: [20]}
+    assert [json['mainKey'] for _, url, json in upstream['calls'] if url.endswith('GetWorldMarketSubList')] == [20]
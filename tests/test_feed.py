@@ -0,0 +1,174 @@
+import json
+from queue import Queue
+from threading import Event
+from time import monotonic, sleep
+from types import SimpleNamespace
+from market.api import MarketAPI
+from market.enum import MarketRegion
+from market.feed import ChangeFeed
+from market.util.cache import LRUCache
+
+def test_change_feed_publishes_changed_records(upstream):
+    feed = ChangeFeed()
+    api = MarketAPI(MarketRegion.NA, local_cache=LRUCache(maxsize=8))
+    api.add_change_listener(feed.record)
+    watcher = feed.subscribe(MarketRegion.NA)
+    filtered = feed.subscribe(MarketRegion.NA, {12})
+    upstream['GetWorldMarketList'] = '11-5-100-2000|12-1-10-300|13-0-0-50|'
+    MarketAPI.GetWorldMarketList.refresh(api, mainCategory=1, subCategory=1)
+    feed.flush()
+    assert watcher.get(timeout=0) is None
+    upstream['GetWorldMarketList'] = '11-5-100-2000|12-0-11-310|14-2-0-90|'
+    MarketAPI.GetWorldMarketList.refresh(api, mainCategory=1, subCategory=1)
+    feed.flush()
+    event = watcher.get(timeout=0)
+    assert (event['region'], event['endpoint']) == ('NA', 'items')
+    assert event['changes'] == [
+        {'id': 12, 'current_stock': 0, 'total_trades': 11, 'base_price': 310},
+        {'id': 14, 'current_stock': 2, 'total_trades': 0, 'base_price': 90},
+        {'id': 13, 'current_stock': 0, 'total_trades': 0, 'base_price': 50, 'removed': True},
+    ]
+    assert [change['id'] for change in filtered.get(timeout=0)['changes']] == [12]
+    MarketAPI.GetWorldMarketList.refresh(api, mainCategory=1, subCategory=1)
+    feed.flush()
+    assert watcher.get(timeout=0) is None
+    watcher.close()
+    filtered.close()
+
+def test_change_feed_order_changes_carry_item_keys(upstream):
+    feed = ChangeFeed()
+    api = MarketAPI(MarketRegion.EU, local_cache=LRUCache(maxsize=8))
+    api.add_change_listener(feed.record)
+    with feed.subscribe(MarketRegion.EU, {7}) as subscription:
+        upstream['GetBiddingInfoList'] = '100-1-0|110-0-2|'
+        MarketAPI.GetBiddingInfoList.refresh(api, mainKey=7, subKey=0)
+        upstream['GetBiddingInfoList'] = '100-3-0|110-0-2|'
+        MarketAPI.GetBiddingInfoList.refresh(api, mainKey=7, subKey=0)
+        feed.flush()
+        assert subscription.get(timeout=0)['changes'] == [{'id': 7, 'sid': 0, 'price': 100, 'sellers': 3, 'buyers': 0}]
+
+class FakePubSub(object):
+    def __init__(self) -> None:
+        self.channels = ()
+        self.messages = Queue()
+
+    def subscribe(self, *channels):
+        self.channels = channels
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+    def close(self):
+        pass
+
+class FakePubSubRedis(object):
+    def __init__(self) -> None:
+        self.published = []
+        self.pubsubs = []
+        self.data = {}
+
+    def publish(self, channel, data):
+        self.published.append((channel, data))
+        receivers = [pubsub for pubsub in self.pubsubs if channel in pubsub.channels]
+        for pubsub in receivers:
+            pubsub.messages.put({'type': 'message', 'channel': channel.encode(), 'data': data.encode()})
+        return len(receivers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub()
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    def wait_for_subscribers(self, count=1, timeout=5):
+        deadline = monotonic() + timeout
+        while sum(bool(pubsub.channels) for pubsub in self.pubsubs) < count and monotonic() < deadline:
+            sleep(0.01)
+
+def test_change_feed_fans_out_through_redis():
+    redis = FakePubSubRedis()
+    feed = ChangeFeed(cache=redis)
+    with feed.subscribe(MarketRegion.EU) as subscription:
+        redis.wait_for_subscribers()
+        feed.publish(MarketRegion.EU, {'region': 'EU', 'endpoint': 'items', 'changes': [{'id': 1}]})
+        assert subscription.get(timeout=5) == {'region': 'EU', 'endpoint': 'items', 'changes': [{'id': 1}]}
+
+def test_change_feed_diffs_against_the_shared_cache_entry(upstream, redis):
+    feed = ChangeFeed()
+    first, second = MarketAPI(MarketRegion.NA, redis, LRUCache(maxsize=8)), MarketAPI(MarketRegion.NA, redis, LRUCache(maxsize=8))
+    for api in (first, second):
+        api.add_change_listener(feed.record)
+    with feed.subscribe(MarketRegion.NA) as subscription:
+        upstream['GetWorldMarketList'] = '11-5-100-2000|'
+        MarketAPI.GetWorldMarketList.refresh(first, mainCategory=1, subCategory=1)
+        upstream['GetWorldMarketList'] = '11-4-101-2000|'
+        MarketAPI.GetWorldMarketList.refresh(second, mainCategory=1, subCategory=1)
+        MarketAPI.GetWorldMarketList.refresh(first, mainCategory=1, subCategory=1)
+        feed.flush()
+        assert subscription.get(timeout=0)['changes'] == [{'id': 11, 'current_stock': 4, 'total_trades': 101, 'base_price': 2000}]
+        assert subscription.get(timeout=0) is None
+
+def test_change_feed_drops_results_when_the_backlog_is_full(monkeypatch):
+    feed = ChangeFeed(backlog=1)
+    started, release = Event(), Event()
+    monkeypatch.setattr(feed, 'publish_changes', lambda *args: started.set() or release.wait(5))
+    api = SimpleNamespace(region=MarketRegion.NA)
+    previous = {'resultMsg': '11-5-100-1900|'}
+    feed.record(api, 'GetWorldMarketList', {}, previous, {'resultMsg': '11-5-100-2000|'})
+    assert started.wait(5)
+    for price in (2100, 2200):
+        feed.record(api, 'GetWorldMarketList', {}, previous, {'resultMsg': f'11-5-100-{price}|'})
+    assert feed._pending.qsize() == 1
+    release.set()
+    feed.flush()
+
+def test_change_feed_is_opt_in(monkeypatch):
+    monkeypatch.delenv('CHANGE_FEED', raising=False)
+    assert ChangeFeed.from_env() is None
+    monkeypatch.setenv('CHANGE_FEED', 'true')
+    assert isinstance(ChangeFeed.from_env(), ChangeFeed)
+
+def test_change_feed_starts_listening_on_first_use_in_each_process():
+    redis = FakePubSubRedis()
+    feed = ChangeFeed(cache=redis)
+    feed.add_event_listener(lambda region, event: None)
+    assert not redis.pubsubs
+    feed.start()
+    redis.wait_for_subscribers()
+    feed.start()
+    assert len(redis.pubsubs) == 1
+    feed._pid = -1
+    feed.start()
+    redis.wait_for_subscribers(2)
+    assert len(redis.pubsubs) == 2
+
+def test_change_feed_listener_survives_bad_messages():
+    redis = FakePubSubRedis()
+    feed = ChangeFeed(cache=redis)
+    with feed.subscribe(MarketRegion.EU) as subscription:
+        redis.wait_for_subscribers()
+        redis.pubsubs[0].messages.put({'type': 'message', 'channel': b'market_changes:EU', 'data': b'not json'})
+        redis.pubsubs[0].messages.put({'type': 'message', 'channel': b'unknown', 'data': b'{}'})
+        feed.publish(MarketRegion.EU, {'region': 'EU', 'endpoint': 'items', 'changes': [{'id': 1}]})
+        assert subscription.get(timeout=5)['changes'] == [{'id': 1}]
+
+def test_stream_route(upstream, client, monkeypatch):
+    assert client.get('/stream?region=NA').status_code == 404
+    feed = ChangeFeed()
+    monkeypatch.setattr(client.application, 'change_feed', feed)
+    api = MarketAPI(MarketRegion.NA, local_cache=LRUCache(maxsize=8))
+    api.add_change_listener(feed.record)
+    upstream['GetBiddingInfoList'] = '100-1-0|'
+    MarketAPI.GetBiddingInfoList.refresh(api, mainKey=31, subKey=2)
+    response = client.get('/stream?region=NA&ids=31&ids=32')
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    events = response.response
+    assert next(events) == b': subscribed\n\n'
+    upstream['GetBiddingInfoList'] = '100-1-4|'
+    MarketAPI.GetBiddingInfoList.refresh(api, mainKey=31, subKey=2)
+    feed.flush()
+    name, data = next(events).decode().splitlines()[:2]
+    assert name == 'event: orders'
+    assert json.loads(data[len('data: '):])['changes'] == [{'id': 31, 'sid': 2, 'price': 100, 'sellers': 1, 'buyers': 4}]
+    response.close()
+    assert feed._subscriptions[MarketRegion.NA] == []
@@ -0,0 +1,76 @@
+import os
+from market.api import MarketAPI
+from market.enum import MarketRegion
+from market.history import HistoryRow, HistoryStore, SUMMARY_SID, day_of
+
+DAY = 86400
+
+def test_history_store_round_trip_across_days(tmp_path):
+    store = HistoryStore(str(tmp_path), flush_interval=0.01)
+    midnight = 20000 * DAY
+    rows = [HistoryRow(midnight + offset, 10, sid, 100 + offset, 1, 2, 3, 4, 5, 6) for offset in (-60, 0, 60) for sid in (0, 1)]
+    store.append(MarketRegion.EU, rows)
+    store.flush()
+    assert sorted(name for name in os.listdir(tmp_path / 'EU') if name.endswith('.sqlite3')) == [f'{day_of(midnight - 60)}.sqlite3', f'{day_of(midnight)}.sqlite3']
+    assert [row.price_min for row in store.query(MarketRegion.EU, 10, sid=1, start=midnight - 120, end=midnight + 120)] == [3, 3, 3]
+    assert [row.ts for row in store.query(MarketRegion.EU, 10, start=midnight - 30, end=midnight + 120)] == [midnight, midnight, midnight + 60, midnight + 60]
+    assert len(store.query(MarketRegion.EU, 10, start=midnight - 120, end=midnight + 120, limit=3)) == 3
+    assert store.query(MarketRegion.NA, 10, start=midnight - 120, end=midnight + 120) == []
+    store.close()
+
+def test_history_store_reuses_read_connections(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), flush_interval=0.01)
+    store.append(MarketRegion.EU, [HistoryRow(1000, 10, 0, 1, 1, 2, 3, 4, 5, 6)])
+    store.flush()
+    connect = store._connect
+    connections = []
+    monkeypatch.setattr(store, '_connect', lambda file, readonly=False: connections.append(file) or connect(file, readonly))
+    for _ in range(3):
+        assert len(store.query(MarketRegion.EU, 10, start=0, end=2000)) == 1
+    store.append(MarketRegion.EU, [HistoryRow(1500, 10, 0, 1, 1, 2, 3, 4, 5, 6)])
+    store.flush()
+    assert len(store.query(MarketRegion.EU, 10, start=0, end=2000)) == 2
+    assert len(connections) == 1
+    store.close()
+
+def test_history_store_reopens_after_fork(tmp_path):
+    store = HistoryStore(str(tmp_path), flush_interval=0.01)
+    store.append(MarketRegion.EU, [HistoryRow(1000, 10, 0, 1, 1, 2, 3, 4, 5, 6)])
+    store.flush()
+    assert len(store.query(MarketRegion.EU, 10, start=0, end=2000)) == 1
+    writer, readers = store._writer, store._readers
+    store._pid = -1
+    store.append(MarketRegion.EU, [HistoryRow(1500, 10, 0, 1, 1, 2, 3, 4, 5, 6)])
+    store.flush()
+    assert store._writer is not writer and store._readers is not readers
+    assert len(store.query(MarketRegion.EU, 10, start=0, end=2000)) == 2
+    store.close()
+    for connection in [connection for connections in readers.values() for connection in connections]:
+        connection.close()
+
+def test_history_store_records_upstream_fetches(upstream, tmp_path):
+    store = HistoryStore(str(tmp_path), flush_interval=0.01)
+    api = MarketAPI(MarketRegion.NA)
+    api.add_listener(store.record)
+    upstream['GetWorldMarketList'] = '11-5-100-2000|'
+    upstream['GetWorldMarketSubList'] = '11-0-0-2000-5-100-1900-2100-2050-1700000000|'
+    api.GetWorldMarketList(mainCategory=99, subCategory=1)
+    api.GetWorldMarketSubList(mainKey=11)
+    store.flush()
+    summary, detail = sorted(store.query(MarketRegion.NA, 11), key=lambda row: row.sid)
+    assert (summary.sid, summary.base_price, summary.current_stock, summary.price_min) == (SUMMARY_SID, 2000, 5, None)
+    assert (detail.sid, detail.price_last, detail.last_sold) == (0, 2050, 1700000000)
+    store.close()
+
+def test_history_route(client, tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), flush_interval=0.01)
+    store.append(MarketRegion.NA, [HistoryRow(1000, 5, 0, 10, 1, 2, 3, 4, 5, 6)])
+    store.flush()
+    monkeypatch.setattr(client.application, 'history_store', store)
+    response = client.get('/history?id=5&start=0&end=2000')
+    assert response.status_code == 200
+    assert response.json == [{'timestamp': 1000, 'id': 5, 'sid': 0, 'base_price': 10, 'current_stock': 1, 'total_trades': 2, 'price_min': 3, 'price_max': 4, 'price_last': 5, 'last_sold': 6}]
+    monkeypatch.setattr(client.application, 'history_store', None)
+    assert client.get('/history?id=5').status_code == 404
+    assert client.get('/history?id=5&end=99999999999999').status_code == 422
+    store.close()
@@ -1,7 +1,80 @@
-import pytest
-from market.util.huffman import HuffmanData
+import tracemalloc
+from io import BytesIO
+from mmap import mmap, ACCESS_READ
+from random import Random
+from struct import pack
+from market.util.huffman import HuffmanData, HuffmanDecoder, codebook_cache, codebook_cache_info, iter_huffman_records, encode_huffman, decode_huffman_bytes
+from tests.helpers import market_list_text, market_sub_list_text, bidding_info_text
+
+CODEBOOK = bytes.fromhex('81000000000000000B000000060000002D000000090000003000000003000000310000000300000032000000020000003300000002000000340000000600000035000000030000003700000004000000380000000100000039000000020000007C000000')
+RAW_DATA = CODEBOOK + bytes.fromhex('850000001100000029000000D30C7890FB1D0E6E4B4C35DF1775BDAA90')
+TEXT = '53801-198-55428-4050|53802-0-17725-70000|'
 
 def test_data():
-    raw_data = bytes.fromhex('81000000000000000B000000060000002D000000090000003000000003000000310000000300000032000000020000003300000002000000340000000600000035000000030000003700000004000000380000000100000039000000020000007C000000850000001100000029000000D30C7890FB1D0E6E4B4C35DF1775BDAA90')
-    data = HuffmanData(raw_data)
-    assert data.data == '53801-198-55428-4050|53802-0-17725-70000|'
\ No newline at end of file
+    data = HuffmanData(RAW_DATA)
+    assert data.data == TEXT
+
+def test_decoder_long_codes():
+    table = {'1' * n + '0': str(n) for n in range(20)}
+    table['1' * 20] = '|'
+    text = '0|19|3|7|'
+    bits = ''.join(next(code for code, char in table.items() if char == c) for c in text)
+    data = int(bits + '0' * (-len(bits) % 8), 2).to_bytes((len(bits) + 7) // 8, 'big')
+    assert HuffmanDecoder(table).decode(data, len(bits)) == text
+    assert HuffmanDecoder(table).decode(data, len(bits) - 1) == text[:-1]
+
+def test_codebook_cache():
+    codebook_cache.clear()
+    first = HuffmanData(RAW_DATA)
+    second = HuffmanData(RAW_DATA)
+    assert first.tree is second.tree
+    first.table.clear()
+    first.frequency.clear()
+    assert second.table and second.frequency
+    assert codebook_cache_info().hits == 1
+    assert codebook_cache_info().misses == 1
+    assert HuffmanData(RAW_DATA).table == second.table
+
+def test_records():
+    records = iter_huffman_records(RAW_DATA, chunk_size=1)
+    assert next(records) == '53801-198-55428-4050'
+    assert list(records) == ['53802-0-17725-70000']
+
+def test_zero_copy_inputs(tmp_path):
+    path = tmp_path / 'payload.bin'
+    path.write_bytes(RAW_DATA)
+    with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+        for source in (bytearray(RAW_DATA), memoryview(RAW_DATA), BytesIO(RAW_DATA), file, mapped):
+            assert HuffmanData(source).data == TEXT
+
+def test_peak_memory():
+    packed = Random(0).randbytes(256 * 1024)
+    size = len(HuffmanData(CODEBOOK + pack('III', len(packed) * 8, len(packed), 0) + packed).data)
+    raw_data = CODEBOOK + pack('III', len(packed) * 8, len(packed), size) + packed
+    for decode, limit in ((decode_huffman_bytes, 1.1), (lambda raw_data: HuffmanData(raw_data).data, 2.1)):
+        tracemalloc.start()
+        try:
+            data = decode(raw_data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert len(data) == size
+        assert peak < limit * size
+
+def test_empty_inputs(tmp_path):
+    path = tmp_path / 'empty.bin'
+    path.write_bytes(b'')
+    with open(path, 'rb') as file:
+        assert HuffmanData(file).data == ''
+    assert HuffmanData(b'').data == ''
+    assert list(iter_huffman_records(b'')) == []
+
+def test_encode():
+    assert encode_huffman(TEXT) == RAW_DATA
+    assert HuffmanData(encode_huffman('')).data == ''
+    assert HuffmanData(encode_huffman('||||')).data == '||||'
+
+def test_encode_market_payloads(market_list_payload, market_sub_list_payload, bidding_info_payload):
+    assert HuffmanData(market_list_payload).data == market_list_text(5000)
+    assert HuffmanData(market_sub_list_payload).data == market_sub_list_text(2000)
+    assert HuffmanData(bidding_info_payload).data == bidding_info_text(5000)
@@ -0,0 +1,17 @@
+import json
+import pytest
+from market.model import ResponseItems, ResponseItemsFormat, ResponseItem, ResponseItemFormat, ResponseItemBidding, ResponseItemBiddingFormat
+from tests.helpers import market_list_text, market_sub_list_text, bidding_info_text
+
+@pytest.mark.parametrize('model, record_format, text', [
+    (ResponseItems, ResponseItemsFormat, market_list_text(100)),
+    (ResponseItem, ResponseItemFormat, market_sub_list_text(100)),
+    (ResponseItemBidding, ResponseItemBiddingFormat, bidding_info_text(100)),
+], ids=['GetWorldMarketList', 'GetWorldMarketSubList', 'GetBiddingInfoList'])
+def test_record_format_matches_schema(model, record_format, text):
+    result = {'resultCode': 0, 'resultMsg': text}
+    assert json.loads(record_format.serialize(record_format.parse(text))) == model.Schema(many=True).dump(result)
+
+def test_record_format_extra_fields():
+    assert ResponseItemsFormat.parse('1-2-3-4-5-6|7-8-9-10||') == [(1, 2, 3, 4), (7, 8, 9, 10)]
+    assert ResponseItemsFormat.serialize([]) == '[]'
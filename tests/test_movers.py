@@ -0,0 +1,82 @@
+from random import Random
+from time import monotonic, sleep
+from types import SimpleNamespace
+from market.api import MarketAPI
+from market.enum import MarketRegion, MoversMetric
+from market.feed import ChangeFeed
+from market.movers import MoversIndex
+from tests.test_feed import FakePubSubRedis
+
+DAY = 86400
+
+def test_movers_rank_changes_since_window_start():
+    index = MoversIndex()
+    now = 100 * DAY
+    index.update(MarketRegion.NA, [(1, 10, 100, 1000), (2, 5, 50, 2000), (3, 0, 10, 500)], now)
+    index.update(MarketRegion.NA, [(1, 8, 103, 1100), (2, 5, 50, 1800)], now + 60)
+    index.update(MarketRegion.NA, [(1, 7, 110, 1200), (4, 1, 1, 10)], now + 120)
+    assert [mover.id for mover in index.top(MarketRegion.NA, MoversMetric.PRICE, 2, now=now + 180)] == [1, 4]
+    assert [mover.id for mover in index.top(MarketRegion.NA, MoversMetric.PRICE, 1, ascending=True, now=now + 180)] == [2]
+    top = index.top(MarketRegion.NA, MoversMetric.PRICE_PCT, 1, now=now + 180)[0]
+    assert (top.id, top.window_price, top.price_change, top.price_change_pct, top.trades_change) == (1, 1000, 200, 20.0, 10)
+    assert [mover.id for mover in index.top(MarketRegion.NA, MoversMetric.STOCK, 10, now=now + 180)] == [1, 2, 4, 3]
+    assert index.top(MarketRegion.EU, MoversMetric.PRICE, 10, now=now + 180) == []
+    rolled = index.top(MarketRegion.NA, MoversMetric.PRICE, 10, now=now + DAY)
+    assert {mover.price_change for mover in rolled} == {0}
+    assert {mover.window_price for mover in rolled if mover.id == 1} == {1200}
+
+def test_movers_indexes_stay_consistent():
+    random = Random(0)
+    index = MoversIndex()
+    for _ in range(50):
+        index.update(MarketRegion.NA, [(random.randrange(200), random.randrange(10), random.randrange(1000), random.randrange(1, 10 ** 6)) for _ in range(100)], DAY)
+    movers = index.top(MarketRegion.NA, MoversMetric.TRADES, 1000, now=DAY)
+    assert len(movers) == len({mover.id for mover in movers})
+    for metric in MoversMetric:
+        ranked = index.top(MarketRegion.NA, metric, 1000, ascending=True, now=DAY)
+        values = [{MoversMetric.PRICE: mover.price_change, MoversMetric.PRICE_PCT: mover.price_change_pct, MoversMetric.TRADES: mover.trades_change, MoversMetric.STOCK: mover.current_stock}[metric] for mover in ranked]
+        assert values == sorted(values)
+
+def test_movers_follow_changes_from_other_processes():
+    redis = FakePubSubRedis()
+    fetching, serving = ChangeFeed(cache=redis), ChangeFeed(cache=redis)
+    fetched, served = MoversIndex(), MoversIndex()
+    serving.add_event_listener(served.apply)
+    assert not redis.pubsubs
+    serving.start()
+    redis.wait_for_subscribers()
+    api = SimpleNamespace(region=MarketRegion.NA)
+    arguments = {'mainCategory': 1, 'subCategory': 1, 'keyType': 0}
+    previous = None
+    for result_msg in ('61-5-100-2000|62-1-10-300|', '61-4-101-2100|62-1-10-300|'):
+        result = {'resultCode': 0, 'resultMsg': result_msg}
+        fetched.record(api, 'GetWorldMarketList', arguments, result)
+        fetching.record(api, 'GetWorldMarketList', arguments, previous, result)
+        previous = result
+    deadline = monotonic() + 5
+    while not served.top(MarketRegion.NA, MoversMetric.STOCK, 1) and monotonic() < deadline:
+        sleep(0.01)
+    assert [(mover.id, mover.price, mover.current_stock) for mover in served.top(MarketRegion.NA, MoversMetric.STOCK, 2)] == [(61, 2100, 4)]
+    assert [(mover.id, mover.price, mover.current_stock) for mover in fetched.top(MarketRegion.NA, MoversMetric.STOCK, 2)] == [(61, 2100, 4), (62, 300, 1)]
+
+def test_movers_load_cached_lists_on_first_use(upstream, redis):
+    upstream['GetWorldMarketList'] = '61-5-100-2000|62-1-10-300|'
+    MarketAPI(MarketRegion.NA, redis).GetWorldMarketList(mainCategory=1, subCategory=1)
+    api = MarketAPI(MarketRegion.NA, redis)
+    calls = [{'mainCategory': 1, 'subCategory': 1}, {'mainCategory': 1, 'subCategory': 2}]
+    cached = MarketAPI.GetWorldMarketList.cached(api, calls)
+    assert cached[1] is None and cached[0]['resultMsg'] == '61-5-100-2000|62-1-10-300|'
+    loads = []
+    index = MoversIndex(loader=lambda region: loads.append(region) or [result for result in MarketAPI.GetWorldMarketList.cached(api, calls) if result is not None])
+    assert [mover.id for mover in index.top(MarketRegion.NA, MoversMetric.STOCK, 2)] == [61, 62]
+    index.top(MarketRegion.NA, MoversMetric.STOCK, 2)
+    assert loads == [MarketRegion.NA]
+    assert len(upstream['calls']) == 1
+
+def test_movers_route(upstream, client):
+    upstream['GetWorldMarketList'] = '61-5-100-2000|62-1-10-300|'
+    client.application.bdo_market_api_manager.api(MarketRegion.EU).GetWorldMarketList(mainCategory=77, subCategory=1)
+    response = client.get('/movers?metric=STOCK&top=1&region=EU')
+    assert response.status_code == 200
+    assert response.json == [{'id': 61, 'price': 2000, 'window_price': 2000, 'price_change': 0, 'price_change_pct': 0.0, 'current_stock': 5, 'total_trades': 100, 'trades_change': 0}]
+    assert client.get('/movers?metric=VOLUME').status_code == 422
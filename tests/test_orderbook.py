@@ -0,0 +1,94 @@
+import pytest
+import numpy as np
+from market.orderbook import DepthLevel, order_book_stats, parse_orders
+from tests.helpers import bidding_info_text
+
+def naive_stats(tiers, percent):
+    tiers = sorted(tiers)
+    asks = [(price, sellers) for price, sellers, _ in tiers if sellers]
+    bids = [(price, buyers) for price, _, buyers in tiers if buyers]
+    best_ask = min(price for price, _ in asks) if asks else None
+    best_bid = max(price for price, _ in bids) if bids else None
+    return {
+        'best_ask': best_ask,
+        'best_bid': best_bid,
+        'ask_depth': sum(sellers for _, sellers in asks),
+        'bid_depth': sum(buyers for _, buyers in bids),
+        'ask_vwap': sum(price * sellers for price, sellers in asks) / sum(sellers for _, sellers in asks) if asks else None,
+        'bid_vwap': sum(price * buyers for price, buyers in bids) / sum(buyers for _, buyers in bids) if bids else None,
+        'ask_liquidity': sum(sellers for price, sellers in asks if price <= best_ask * (1 + percent / 100)),
+        'bid_liquidity': sum(buyers for price, buyers in bids if price >= best_bid * (1 - percent / 100)),
+        'depth': [
+            (price, sum(b for p, _, b in tiers if p >= price), sum(s for p, s, _ in tiers if p <= price))
+            for price, _, _ in tiers
+        ],
+    }
+
+def test_parse_orders():
+    assert parse_orders('100-1-0|110-0-2|').tolist() == [[100, 1, 0], [110, 0, 2]]
+    assert parse_orders('100-1-0-9|').tolist() == [[100, 1, 0]]
+    assert parse_orders('').shape == (0, 3)
+    assert parse_orders('100-1-0-9|110-0-2-3|120-5-0-1|').tolist() == [[100, 1, 0], [110, 0, 2], [120, 5, 0]]
+    for text in ('abc-0-2', '100-1|', '1--2-3'):
+        with pytest.raises(ValueError):
+            parse_orders(text)
+
+@pytest.mark.parametrize('percent', [0, 5, 50])
+def test_order_book_stats_matches_naive(percent):
+    texts = [bidding_info_text(count) for count in (1, 30, 0, 7)] + ['100-0-0|', '120-3-0|100-0-4|']
+    stats = order_book_stats([parse_orders(text) for text in texts], percent)
+    for text, result in zip(texts, stats):
+        expected = naive_stats(parse_orders(text).tolist(), percent)
+        assert result.depth == [DepthLevel(*level) for level in expected.pop('depth')]
+        for name, value in expected.items():
+            assert getattr(result, name) == pytest.approx(value), name
+    assert (stats[5].best_bid, stats[5].best_ask, stats[5].spread, stats[5].mid) == (100, 120, 20, 110)
+    assert stats[2].depth == [] and stats[2].best_ask is None
+
+def test_order_book_stats_empty():
+    assert order_book_stats([]) == []
+    assert order_book_stats([np.empty((0, 3), dtype=np.int64)])[0].bid_depth == 0
+
+def test_orders_stats_routes(upstream, client, monkeypatch):
+    import market
+    upstream['GetBiddingInfoList'] = '90-0-3|100-0-2|110-4-0|200-1-0|'
+    response = client.get('/orders/stats?id=7&sid=0&region=NA&percent=10')
+    assert response.status_code == 200
+    assert response.json['best_bid'] == 100 and response.json['best_ask'] == 110 and response.json['spread'] == 10
+    assert (response.json['bid_liquidity'], response.json['ask_liquidity']) == (5, 4)
+    assert response.json['depth'][0] == {'price': 90, 'bids': 5, 'asks': 0}
+    def failing(*args, **kwargs):
+        raise AssertionError('stats should be served from the render cache')
+    monkeypatch.setattr(market, 'order_book_stats', failing)
+    response = client.post('/orders/stats/batch', json={'region': 'NA', 'percent': 10, 'keys': [{'id': 7, 'sid': 0}]})
+    assert response.status_code == 200
+    assert response.json[0]['id'] == 7 and response.json[0]['result']['ask_vwap'] == pytest.approx(128)
+
+def test_orders_stats_are_shared_through_the_cache(upstream, redis, client, monkeypatch):
+    import market
+    from market.api import MarketAPIManager
+    monkeypatch.setattr(client.application, 'bdo_market_api_manager', MarketAPIManager(redis))
+    upstream['GetBiddingInfoList'] = '90-0-3|100-0-2|110-4-0|200-1-0|'
+    first = client.get('/orders/stats?id=9&sid=0&region=NA&percent=10').json
+    assert redis.get('NA_GetBiddingInfoList__9_0_stats_10.0') is not None
+    def failing(*args, **kwargs):
+        raise AssertionError('stats should be served from the shared cache')
+    monkeypatch.setattr(market, 'order_book_stats', failing)
+    market.render_cache.clear()
+    assert client.get('/orders/stats?id=9&sid=0&region=NA&percent=10').json == first
+
+def test_orders_stats_batch_reports_malformed_books_per_key(upstream, client, monkeypatch):
+    from market.api import MarketAPI
+    from tests.conftest import FakeResponse
+    request = MarketAPI.request
+    def malformed_request(self, url, **kwargs):
+        if kwargs['json']['mainKey'] == 8:
+            return FakeResponse('abc-0-2|')
+        return request(self, url, **kwargs)
+    monkeypatch.setattr(MarketAPI, 'request', malformed_request)
+    upstream['GetBiddingInfoList'] = '90-0-3|100-0-2|110-4-0|'
+    response = client.post('/orders/stats/batch', json={'region': 'NA', 'keys': [{'id': 7, 'sid': 0}, {'id': 8, 'sid': 0}]})
+    assert response.status_code == 200
+    assert response.json[0]['result']['best_ask'] == 110
+    assert (response.json[1]['id'], response.json[1]['error']) == (8, 'malformed upstream response')
+    assert client.get('/orders/stats?id=8&sid=0').status_code == 502
@@ -0,0 +1,74 @@
+import pytest
+from threading import Thread
+from requests import Response
+from requests.exceptions import ConnectTimeout
+from market.common.api import API
+from market.util.ratelimit import AIMDLimit, LimitExceeded, TokenBucket
+
+def test_aimd_limit_grows_while_saturated_and_halves_once_per_round_trip():
+    limit = AIMDLimit(initial=2, maximum=4)
+    for _ in range(8):
+        first, second = limit.acquire(), limit.acquire()
+        limit.release(first)
+        limit.release(second)
+    assert limit.limit > 3
+    started = [limit.acquire() for _ in range(3)]
+    for token in started:
+        limit.release(token, overloaded=True)
+    assert 1.5 < limit.limit < 2.5
+
+def test_aimd_limit_does_not_grow_when_idle():
+    limit = AIMDLimit(initial=4)
+    for _ in range(100):
+        limit.release(limit.acquire())
+    assert limit.limit == 4
+
+def test_aimd_limit_queues_and_times_out():
+    limit = AIMDLimit(initial=1)
+    token = limit.acquire()
+    assert limit.acquire(timeout=0.01) is None
+    waiter = Thread(target=lambda: limit.release(limit.acquire(timeout=5)))
+    waiter.start()
+    while limit.waiting == 0:
+        pass
+    limit.release(token)
+    waiter.join(5)
+    assert limit.in_flight == 0 and limit.waiting == 0
+
+class FakeSession(object):
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    def request(self, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = Response()
+        response.status_code = outcome
+        return response
+
+def test_api_request_feeds_the_concurrency_limit():
+    api = API(server='localhost', concurrency_limit=AIMDLimit(initial=4), rate_limit=TokenBucket(0), retries=0)
+    api._session = FakeSession([200, 429, ConnectTimeout()])
+    api.request(url='ok', method='GET')
+    assert api.concurrency_limit.limit == 4
+    with pytest.raises(Exception):
+        api.request(url='throttled', method='GET')
+    assert api.concurrency_limit.limit == 2
+    with pytest.raises(ConnectTimeout):
+        api.request(url='timeout', method='GET')
+    assert api.concurrency_limit.limit == 1
+    assert api.concurrency_limit.in_flight == 0
+
+def test_api_request_rate_limit_timeout():
+    api = API(server='localhost', rate_limit=TokenBucket(1, 1), limit_timeout=0.01)
+    api._session = FakeSession([200])
+    api.request(url='ok', method='GET')
+    with pytest.raises(LimitExceeded):
+        api.request(url='limited', method='GET')
+
+def test_api_request_charges_every_retry():
+    api = API(server='localhost', rate_limit=TokenBucket(1, 3), limit_timeout=0.01, backoff_factor=0)
+    api._session = FakeSession([ConnectTimeout(), ConnectTimeout(), 200])
+    assert api.request(url='flaky', method='GET').status_code == 200
+    assert not api.rate_limit.try_acquire()
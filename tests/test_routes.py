@@ -0,0 +1,122 @@
+import pytest
+from tests.helpers import market_list_text
+
+def test_items_route(upstream, client):
+    upstream['GetWorldMarketList'] = '53801-198-55428-4050|53802-0-17725-70000|'
+    response = client.get('/items?category=25&subcategory=1&region=NA')
+    assert response.status_code == 200
+    assert response.json == [
+        {'id': 53801, 'current_stock': 198, 'total_trades': 55428, 'base_price': 4050},
+        {'id': 53802, 'current_stock': 0, 'total_trades': 17725, 'base_price': 70000},
+    ]
+
+def test_orders_batch_route(upstream, client):
+    upstream['GetBiddingInfoList'] = '100-1-0|110-0-2|'
+    response = client.post('/orders/batch', json={'region': 'EU', 'keys': [{'id': 1, 'sid': 0}, {'id': 2, 'sid': 5}]})
+    assert response.status_code == 200
+    assert response.json == [
+        {'id': 1, 'sid': 0, 'result': [{'price': 100, 'sellers': 1, 'buyers': 0}, {'price': 110, 'sellers': 0, 'buyers': 2}]},
+        {'id': 2, 'sid': 5, 'result': [{'price': 100, 'sellers': 1, 'buyers': 0}, {'price': 110, 'sellers': 0, 'buyers': 2}]},
+    ]
+
+def test_item_batch_route_reports_errors_per_key(upstream, client, monkeypatch):
+    from market.api import MarketAPI
+    request = MarketAPI.request
+    def failing_request(self, url, **kwargs):
+        if kwargs['json']['mainKey'] == 2:
+            raise ValueError('upstream failed')
+        return request(self, url, **kwargs)
+    monkeypatch.setattr(MarketAPI, 'request', failing_request)
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    response = client.post('/item/batch', json={'ids': [1, 2]})
+    assert response.status_code == 200
+    assert response.json[0]['result'][0]['sid'] == 0
+    assert response.json[1] == {'id': 2, 'error': 'malformed upstream response'}
+
+def test_item_batch_route_hides_error_details(upstream, client, monkeypatch):
+    from requests.exceptions import HTTPError
+    from market.api import MarketAPI
+    request = MarketAPI.request
+    def failing_request(self, url, **kwargs):
+        if kwargs['json']['mainKey'] == 2:
+            raise HTTPError(f'500 Server Error for url: {url}')
+        return request(self, url, **kwargs)
+    monkeypatch.setattr(MarketAPI, 'request', failing_request)
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    response = client.post('/item/batch', json={'ids': [1, 2]})
+    assert response.status_code == 200
+    assert response.json[1] == {'id': 2, 'error': 'upstream request failed'}
+
+def test_item_batch_route_reports_malformed_key(upstream, client, monkeypatch):
+    from market.api import MarketAPI
+    from tests.conftest import FakeResponse
+    request = MarketAPI.request
+    def malformed_request(self, url, **kwargs):
+        if kwargs['json']['mainKey'] == 2:
+            return FakeResponse('x-0|')
+        return request(self, url, **kwargs)
+    monkeypatch.setattr(MarketAPI, 'request', malformed_request)
+    upstream['GetWorldMarketSubList'] = '1-0-0-1-1-1-1-1-1-1|'
+    response = client.post('/item/batch', json={'ids': [1, 2]})
+    assert response.status_code == 200
+    assert response.json[0]['result'][0]['sid'] == 0
+    assert response.json[1] == {'id': 2, 'error': 'malformed upstream response'}
+
+def test_batch_route_validates_size(client):
+    assert client.post('/item/batch', json={'ids': []}).status_code == 422
+
+def test_items_route_etag(upstream, client, monkeypatch):
+    from market.api import MarketAPI
+    from market.enum import MarketRegion
+    from market.util.record import RecordFormat
+    upstream['GetWorldMarketList'] = '53801-198-55428-4050|'
+    response = client.get('/items?category=25&subcategory=2&region=NA')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag
+    serialize = RecordFormat.serialize
+    monkeypatch.setattr(RecordFormat, 'serialize', lambda *args: pytest.fail('serialized a cached response'))
+    cached = client.get('/items?category=25&subcategory=2&region=NA')
+    assert cached.status_code == 200 and cached.json == response.json
+    not_modified = client.get('/items?category=25&subcategory=2&region=NA', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+    assert client.get('/items?category=25&subcategory=2&region=NA', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+    monkeypatch.setattr(RecordFormat, 'serialize', serialize)
+    upstream['GetWorldMarketList'] = '53801-197-55429-4050|'
+    MarketAPI.GetWorldMarketList.refresh(client.application.bdo_market_api_manager.api(MarketRegion.NA), mainCategory=25, subCategory=2)
+    changed = client.get('/items?category=25&subcategory=2&region=NA', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.json[0]['current_stock'] == 197
+
+def test_items_route_compression(upstream, client, monkeypatch):
+    import gzip
+    upstream['GetWorldMarketList'] = market_list_text(200)
+    plain = client.get('/items?category=25&subcategory=3&region=NA')
+    compressed = client.get('/items?category=25&subcategory=3&region=NA', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert gzip.decompress(compressed.data) == plain.data
+    assert len(compressed.data) < len(plain.data) / 2
+    monkeypatch.setattr('market.compress', lambda *args: pytest.fail('compressed a cached response'))
+    again = client.get('/items?category=25&subcategory=3&region=NA', headers={'Accept-Encoding': 'gzip'})
+    assert again.data == compressed.data
+    not_modified = client.get('/items?category=25&subcategory=3&region=NA', headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert not_modified.status_code == 304
+
+def test_route_returns_503_when_upstream_limited(client, monkeypatch):
+    from market.api import MarketAPI
+    from market.util.ratelimit import LimitExceeded
+    def limited(self, **kwargs):
+        raise LimitExceeded('rate limit reached')
+    monkeypatch.setattr(MarketAPI, 'request', limited)
+    response = client.get('/item?id=987654&region=EU')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+def test_hot_path_metrics_are_exported(upstream, client):
+    upstream['GetBiddingInfoList'] = '100-1-0|'
+    client.get('/orders?id=4242&sid=0&region=NA')
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'market_upstream_latency_seconds_count{method="GetBiddingInfoList",outcome="ok",region="NA"}' in metrics
+    assert 'market_render_seconds_count{endpoint="market.orders",stage="parse"}' in metrics
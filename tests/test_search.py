@@ -0,0 +1,83 @@
+import pytest
+from market.api import MarketAPI
+from market.enum import MarketRegion
+from market.feed import ChangeFeed
+from market.search import SearchIndex, load_catalog
+
+CATALOG = {
+    10007: 'Kzarka Longsword',
+    10010: 'Kzarka Shortsword',
+    11101: 'Black Stone (Weapon)',
+    16001: 'Black Stone (Armor)',
+    4901: 'Sharp Black Crystal Shard',
+    721003: 'Caphras Stone',
+}
+
+def ids(results):
+    return [item_id for item_id, _ in results]
+
+def test_search_prefix_and_tokens():
+    index = SearchIndex(CATALOG)
+    assert ids(index.search('kzar')) == [10007, 10010]
+    assert ids(index.search('black st')) == [16001, 11101]
+    assert ids(index.search('stone black')) == [16001, 11101]
+    assert ids(index.search('Caphras Stone')) == [721003]
+    assert ids(index.search('black', limit=1)) == [16001]
+    assert index.search('nothing here') == []
+
+def test_search_fuzzy():
+    index = SearchIndex(CATALOG)
+    assert ids(index.search('kzraka')) == [10007, 10010]
+    assert ids(index.search('blakc stone')) == [16001, 11101]
+    assert ids(index.search('caphras stoen')) == [721003]
+
+def test_search_skips_fuzzy_walks_after_empty_intersection(monkeypatch):
+    index = SearchIndex(CATALOG)
+    monkeypatch.setattr(index, '_fuzzy', lambda *args: pytest.fail('fuzzy walk after an empty intersection'))
+    assert index.search('kzarka caphras blakc') == []
+
+def test_search_incremental_updates():
+    index = SearchIndex(CATALOG)
+    index.add(10007, 'Dandelion Longsword')
+    assert ids(index.search('kzarka')) == [10010]
+    assert ids(index.search('dande')) == [10007]
+    index.add_ids([10007, 99999])
+    assert index.name(10007) == 'Dandelion Longsword'
+    assert index.search('99999') == [(99999, None)]
+    index.add(99999, 'Memory Fragment')
+    assert ids(index.search('memory frag')) == [99999]
+
+def test_search_prefix_matches_ids():
+    index = SearchIndex(CATALOG)
+    assert ids(index.search('100')) == [10007, 10010]
+    assert ids(index.search('7210')) == [721003]
+    assert ids(index.search('kzarka 10010')) == [10010]
+
+def test_search_learns_ids_from_fetches_and_changes(upstream):
+    index = SearchIndex()
+    api = MarketAPI(MarketRegion.NA)
+    api.add_listener(index.record)
+    upstream['GetWorldMarketList'] = '44195-5-100-2000|'
+    MarketAPI.GetWorldMarketList.refresh(api, mainCategory=3, subCategory=1)
+    assert 44195 in index
+    feed = ChangeFeed()
+    feed.add_event_listener(index.apply)
+    feed.publish(MarketRegion.EU, {'region': 'EU', 'endpoint': 'items', 'changes': [{'id': 44196, 'current_stock': 1, 'total_trades': 1, 'base_price': 10}]})
+    assert ids(index.search('4419')) == [44195, 44196]
+
+def test_load_catalog(tmp_path):
+    path = tmp_path / 'items.yml'
+    path.write_text('10007: Kzarka Longsword\n"721003": Caphras Stone\n')
+    assert load_catalog(str(path)) == {10007: 'Kzarka Longsword', 721003: 'Caphras Stone'}
+
+def test_search_route(client, monkeypatch):
+    monkeypatch.setattr(client.application, 'search_index', SearchIndex(CATALOG))
+    response = client.get('/search?query=kzarka%20long')
+    assert response.status_code == 200
+    assert response.json == [{'id': 10007, 'name': 'Kzarka Longsword'}]
+    assert client.get('/search?query=').status_code == 422
+
+def test_search_fuzzy_prefix():
+    index = SearchIndex(CATALOG)
+    assert ids(index.search('caprha')) == [721003]
+    assert ids(index.search('shrp blak')) == [4901]
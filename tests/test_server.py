@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import pytest
+import subprocess
+
+# Runs in a subprocess so that monkey patching does not leak into the test session.
+LOAD_TEST = '''
+from gevent import monkey
+monkey.patch_all()
+
+import sys
+import json
+import gevent
+import requests
+from time import monotonic
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+from market import web_app, bdo_market_api_manager
+from market.enum import MarketRegion
+
+delay = float(sys.argv[1])
+
+def slow_upstream(environ, start_response):
+    gevent.sleep(delay)
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [json.dumps({'resultCode': 0, 'resultMsg': '53801-198-55428-4050|'}).encode()]
+
+upstream = WSGIServer(('127.0.0.1', 0), slow_upstream, log=None)
+upstream.start()
+bdo_market_api_manager.api(MarketRegion.NA)._url = f'http://127.0.0.1:{upstream.server_port}'
+market = WSGIServer(('127.0.0.1', 0), web_app, spawn=Pool(1000), log=None)
+market.start()
+
+results = {}
+for concurrency in map(int, sys.argv[2:]):
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    started = monotonic()
+    urls = [f'http://127.0.0.1:{market.server_port}/items?category={concurrency}&subcategory={index}' for index in range(concurrency)]
+    responses = Pool(concurrency).map(session.get, urls)
+    assert all(response.status_code == 200 for response in responses)
+    results[concurrency] = concurrency / (monotonic() - started)
+print(json.dumps(results))
+'''
+
+def test_gevent_throughput_scales_with_slow_upstream():
+    env = dict(os.environ, LOCAL_CACHE_SIZE='0', UPSTREAM_POOL_SIZE='100', UPSTREAM_RATE='0', UPSTREAM_CONCURRENCY='100')
+    env.pop('REDIS_URL', None)
+    env.pop('REDIS_CLUSTER_URL', None)
+    output = subprocess.run([sys.executable, '-c', LOAD_TEST, '0.2', '1', '10', '50'], env=env, capture_output=True, text=True, timeout=60, check=True).stdout
+    throughput = {int(concurrency): rate for concurrency, rate in json.loads(output.strip().splitlines()[-1]).items()}
+    assert throughput[10] > 5 * throughput[1]
+    assert throughput[50] > 10 * throughput[1]
+
+def test_worker_processes_reload_and_stop():
+    from threading import Thread
+    from time import sleep
+    from market.util.workers import WorkerProcesses
+    workers = WorkerProcesses([sys.executable, '-c', 'import time; time.sleep(30)'], workers=2, grace=0.1, shutdown_timeout=5)
+    runner = Thread(target=workers.run)
+    runner.start()
+    sleep(0.5)
+    first = set(workers.pids)
+    assert len(first) == 2
+    workers.reload()
+    sleep(0.5)
+    second = set(workers.pids)
+    assert len(second) == 2 and not first & second
+    workers.stop()
+    runner.join(10)
+    assert not runner.is_alive() and workers.pids == []
+
+# Each client process hammers the server with keep-alive requests for a fixed time.
+LOAD_CLIENT = '''
+import sys
+import requests
+from time import monotonic
+session = requests.Session()
+url, duration, count = sys.argv[1], float(sys.argv[2]), 0
+deadline = monotonic() + duration
+while monotonic() < deadline:
+    session.get(url).raise_for_status()
+    count += 1
+print(count)
+'''
+
+def prefork_throughput(workers: int, clients: int, duration: float = 3.0) -> float:
+    import socket
+    from time import sleep
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, MARKET_SERVER='prefork', MARKET_WORKERS=str(workers), MARKET_HOST='127.0.0.1', MARKET_PORT=str(port), LOCAL_CACHE_SIZE='0')
+    env.pop('REDIS_URL', None)
+    env.pop('REDIS_CLUSTER_URL', None)
+    server = subprocess.Popen([sys.executable, '-m', 'market'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}/api-spec.json'
+        for _ in range(100):
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    break
+            except OSError:
+                sleep(0.2)
+        sleep(workers)
+        loaders = [subprocess.Popen([sys.executable, '-c', LOAD_CLIENT, url, str(duration)], stdout=subprocess.PIPE, text=True) for _ in range(clients)]
+        return sum(int(loader.communicate(timeout=60)[0]) for loader in loaders) / duration
+    finally:
+        server.terminate()
+        server.wait(30)
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 4, reason='needs at least 4 cores to measure scaling across workers')
+def test_prefork_throughput_scales_with_workers():
+    single = prefork_throughput(workers=1, clients=2)
+    double = prefork_throughput(workers=2, clients=4)
+    assert double > 1.6 * single
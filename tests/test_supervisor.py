@@ -0,0 +1,24 @@
+from threading import Event, Thread
+from market.util.supervisor import Supervisor
+
+def test_supervisor_restarts_with_backoff():
+    runs = []
+    def crash():
+        runs.append(1)
+        raise RuntimeError('boom')
+    supervisor = Supervisor(max_restarts=2, backoff=0.01)
+    supervisor.add('crash', crash)
+    assert supervisor.run() == 1
+    assert len(runs) == 3
+
+def test_supervisor_stop_wakes_without_polling():
+    stopped = Event()
+    supervisor = Supervisor()
+    supervisor.add('blocking', lambda: stopped.wait(5), stopped.set)
+    runs = []
+    runner = Thread(target=lambda: runs.append(supervisor.run()))
+    runner.start()
+    supervisor.stop()
+    runner.join(5)
+    assert runs == [0]
+    assert not supervisor.services[0].alive